@@ -0,0 +1,66 @@
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from portfolio import PortfolioTracker
+
+# Benchmark for incremental portfolio valuation with a club-wide number of members
+PORTFOLIO_COUNT = 50_000
+HOLDINGS_PER_PORTFOLIO = 5
+SYMBOLS = [f"C{i:03d}" for i in range(160)] + ["BTC", "ETH", "SOL", "XRP", "BNB", "DOGE", "ADA", "TRX", "AAPL", "MSFT", "AMZN", "GOOGL"]
+TICKS = 20
+
+def timed(label, func):
+    start = time.perf_counter()
+    result = func()
+    print(f"{label:<45} {(time.perf_counter() - start) * 1000:10.3f} ms")
+    return result
+
+# Function to write a holdings table like the one the bot keeps in portfolio.db
+def make_database(path, rng):
+    db = sqlite3.connect(path)
+    db.execute("CREATE TABLE holdings (user_id INTEGER NOT NULL, symbol TEXT NOT NULL, quantity REAL NOT NULL, PRIMARY KEY (user_id, symbol))")
+    rows = ((user_id, symbol, rng.uniform(0.1, 1000)) for user_id in range(PORTFOLIO_COUNT) for symbol in rng.sample(SYMBOLS, HOLDINGS_PER_PORTFOLIO))
+    db.executemany("INSERT INTO holdings VALUES (?, ?, ?)", rows)
+    db.commit()
+    db.close()
+
+# Reference implementation: revalue every portfolio from scratch on each tick
+def full_revaluation(tracker):
+    return {user_id: tracker._value(holdings) for user_id, holdings in tracker.holdings.items()}
+
+def main():
+    rng = random.Random(42)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "portfolio.db")
+        timed(f"write {PORTFOLIO_COUNT} portfolios to SQLite", lambda: make_database(path, rng))
+        tracker = PortfolioTracker(path)
+        timed("open + load + initial valuation", tracker.open)
+
+        prices = {symbol: rng.uniform(0.001, 50_000) for symbol in SYMBOLS}
+        timed("first snapshot (all symbols priced)", lambda: tracker.update_prices(prices))
+
+        # A crypto refresh: only the 8 coin prices move
+        crypto = ["BTC", "ETH", "SOL", "XRP", "BNB", "DOGE", "ADA", "TRX"]
+        start = time.perf_counter()
+        revalued = 0
+        for _ in range(TICKS):
+            revalued += tracker.update_prices({symbol: prices[symbol] * rng.uniform(0.99, 1.01) for symbol in crypto})
+        elapsed = (time.perf_counter() - start) / TICKS * 1000
+        print(f"{'incremental crypto tick (avg)':<45} {elapsed:10.3f} ms  ({revalued // TICKS} positions)")
+        timed("full revaluation of every portfolio", lambda: full_revaluation(tracker))
+
+        expected = full_revaluation(tracker)
+        drift = max(abs(tracker.totals[user_id] - value) / max(abs(value), 1) for user_id, value in expected.items())
+        print(f"{'max relative drift vs full revaluation':<45} {drift:10.2e}")
+        assert drift < 1e-9, "incremental totals drifted from a full revaluation"
+
+        start = time.perf_counter()
+        for user_id in range(PORTFOLIO_COUNT):
+            tracker.total(user_id)
+        print(f"{'/portfolio total lookup (avg)':<45} {(time.perf_counter() - start) / PORTFOLIO_COUNT * 1e6:10.3f} us")
+        tracker.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+import time
+import numpy as np
+from rates import RateTable, render_comparison_panel, top_movers
+
+# Benchmark for the NumPy rate table with a full ExchangeRate-API sized universe
+CURRENCY_COUNT = 170
+REPEATS = 50
+
+# Function to build a synthetic snapshot of `count` currencies quoted per USD
+def make_rates(count, seed):
+    rng = np.random.default_rng(seed)
+    codes = ["USD"] + [f"C{i:03d}" for i in range(1, count)]
+    values = np.exp(rng.uniform(-3.0, 9.0, count))
+    values[0] = 1.0
+    return dict(zip(codes, values.tolist()))
+
+# Reference implementation: per-pair Python loop, as the bot used to do it
+def loop_cross_rates(rates):
+    return {(base, quote): (1 / rates[base]) * rates[quote] for base in rates for quote in rates}
+
+def timed(label, func):
+    start = time.perf_counter()
+    for _ in range(REPEATS):
+        result = func()
+    elapsed = (time.perf_counter() - start) / REPEATS * 1000
+    print(f"{label:<40} {elapsed:10.3f} ms")
+    return result
+
+def main():
+    previous_rates = make_rates(CURRENCY_COUNT, seed=1)
+    noise = 1 + np.random.default_rng(2).normal(0, 0.01, CURRENCY_COUNT)
+    current_rates = {code: rate * change for (code, rate), change in zip(previous_rates.items(), noise)}
+    previous = RateTable.from_rates(previous_rates)
+    codes = list(current_rates)
+
+    print(f"Currencies: {CURRENCY_COUNT}, repeats: {REPEATS}")
+    timed("python loop cross rates (N×N)", lambda: loop_cross_rates(current_rates))
+    table = timed("RateTable.from_rates", lambda: RateTable.from_rates(current_rates))
+    timed("cross matrix (N×N outer)", lambda: RateTable(table.codes, table.units).cross_matrix())
+    table.cross_matrix()
+    timed("comparison panel, every base", lambda: [render_comparison_panel(table, base, codes[:8], base, previous) for base in codes])
+    timed("top movers, every base", lambda: [top_movers(table, previous, base) for base in codes])
+
+if __name__ == "__main__":
+    main()
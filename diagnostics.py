@@ -0,0 +1,187 @@
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import Counter, deque
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# Code objects of handlers and fetchers we want to name when they block the loop
+_tracked_code = {}
+
+# Frames the loop sits in while waiting for I/O, counted as idle instead of hot paths
+IDLE_FUNCTIONS = {"select", "poll", "epoll", "_run_once"}
+
+# Function to mark a handler or fetcher so blocking reports can name it.
+# It only registers the code object and returns the function untouched,
+# so it costs nothing when diagnostics mode is off.
+def track(func):
+    _tracked_code[func.__code__] = func.__qualname__
+    return func
+
+def _env_float(name, default):
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        logger.warning(f"Invalid value for {name}, using default {default}.")
+        return float(default)
+
+def _frame_label(frame):
+    return f"{os.path.basename(frame.f_code.co_filename)}:{frame.f_code.co_name}"
+
+# Event-loop diagnostics: a lag probe task running inside the loop keeps a
+# heartbeat, and a watchdog thread samples the loop thread's stack. When the
+# heartbeat stalls longer than the threshold the loop is blocked; the sampled
+# stack shows who is blocking it. All samples also feed a folded-stack
+# profile (flamegraph format) that is dumped periodically to a local file.
+class LoopDiagnostics:
+    def __init__(self, block_threshold=0.2, sample_interval=0.01, probe_interval=0.05, dump_interval=60, profile_path="diagnostics_profile.txt"):
+        self.block_threshold = block_threshold
+        self.sample_interval = sample_interval
+        self.probe_interval = probe_interval
+        self.dump_interval = dump_interval
+        self.profile_path = profile_path
+        self._loop_thread_id = None
+        self._heartbeat = time.monotonic()
+        self._probe_task = None
+        self._watchdog = None
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+        self._profile = Counter()
+        self._idle_samples = 0
+        self._lags = deque(maxlen=1000)
+        self._max_lag = 0.0
+        self.slow_events = deque(maxlen=50)
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            block_threshold=_env_float("DIAGNOSTICS_BLOCK_THRESHOLD_MS", 200) / 1000,
+            sample_interval=_env_float("DIAGNOSTICS_SAMPLE_INTERVAL_MS", 10) / 1000,
+            dump_interval=_env_float("DIAGNOSTICS_DUMP_INTERVAL", 60),
+            profile_path=os.getenv("DIAGNOSTICS_PROFILE_PATH", "diagnostics_profile.txt"),
+        )
+
+    # Must be called from inside the running event loop
+    def start(self):
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stopped.clear()
+        self._probe_task = asyncio.get_running_loop().create_task(self._probe())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-diagnostics", daemon=True)
+        self._watchdog.start()
+        logger.info(f"Loop diagnostics enabled (block threshold {self.block_threshold * 1000:.0f} ms, profile at {self.profile_path}).")
+
+    async def stop(self):
+        self._stopped.set()
+        if self._probe_task:
+            self._probe_task.cancel()
+            try:
+                await self._probe_task
+            except asyncio.CancelledError:
+                pass
+            self._probe_task = None
+        if self._watchdog:
+            await asyncio.get_running_loop().run_in_executor(None, self._watchdog.join)
+            self._watchdog = None
+        self.dump()
+
+    def metrics(self):
+        with self._lock:
+            lags = sorted(self._lags)
+            return {
+                "lag_p50_ms": round(lags[len(lags) // 2] * 1000, 1) if lags else None,
+                "lag_max_ms": round(self._max_lag * 1000, 1),
+                "slow_events": len(self.slow_events),
+                "busy_samples": sum(self._profile.values()),
+                "idle_samples": self._idle_samples,
+            }
+
+    # Sleep for a fixed interval and measure how late the loop wakes us up
+    async def _probe(self):
+        while True:
+            started = time.monotonic()
+            await asyncio.sleep(self.probe_interval)
+            now = time.monotonic()
+            lag = max(0.0, now - started - self.probe_interval)
+            self._heartbeat = now
+            with self._lock:
+                self._lags.append(lag)
+                self._max_lag = max(self._max_lag, lag)
+
+    def _watch(self):
+        blocked_since = None
+        offender = None
+        stack = None
+        last_dump = time.monotonic()
+        while not self._stopped.wait(self.sample_interval):
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            self._sample(frame)
+            now = time.monotonic()
+            stalled = now - self._heartbeat
+            if stalled > self.block_threshold + self.probe_interval:
+                if blocked_since is None:
+                    blocked_since = self._heartbeat
+                    offender = self._find_offender(frame)
+                    stack = "".join(traceback.format_stack(frame))
+            elif blocked_since is not None:
+                # The probe's own sleep is not part of the stall
+                self._report_block(offender, max(0.0, self._heartbeat - blocked_since - self.probe_interval), stack)
+                blocked_since = None
+            del frame
+            if now - last_dump >= self.dump_interval:
+                last_dump = now
+                self.dump()
+
+    def _sample(self, frame):
+        labels = []
+        top = frame
+        while frame is not None:
+            labels.append(_frame_label(frame))
+            frame = frame.f_back
+        with self._lock:
+            if top.f_code.co_name in IDLE_FUNCTIONS:
+                self._idle_samples += 1
+            else:
+                self._profile[";".join(reversed(labels))] += 1
+
+    # Name the innermost tracked handler or fetcher on the blocked stack
+    @staticmethod
+    def _find_offender(frame):
+        innermost = None
+        while frame is not None:
+            if frame.f_code in _tracked_code:
+                return _tracked_code[frame.f_code]
+            if innermost is None and "site-packages" not in frame.f_code.co_filename:
+                innermost = _frame_label(frame)
+            frame = frame.f_back
+        return innermost or "unknown"
+
+    def _report_block(self, offender, duration, stack):
+        event = {"time": datetime.utcnow().isoformat(timespec="seconds"), "offender": offender, "duration_ms": round(duration * 1000, 1), "stack": stack}
+        with self._lock:
+            self.slow_events.append(event)
+        logger.warning(f"Event loop blocked for {event['duration_ms']} ms by {offender}. Stack when detected:\n{stack}")
+
+    # Write the folded-stack profile and recent slow events for offline analysis
+    def dump(self):
+        with self._lock:
+            profile = self._profile.most_common()
+            events = list(self.slow_events)
+        metrics = self.metrics()
+        try:
+            with open(self.profile_path, "w", encoding="utf-8") as f:
+                f.write(f"# loop diagnostics profile, written {datetime.utcnow().isoformat(timespec='seconds')}Z\n")
+                f.write(f"# {metrics}\n")
+                for event in events:
+                    f.write(f"# slow: {event['time']} {event['offender']} {event['duration_ms']} ms\n")
+                for stack, count in profile:
+                    f.write(f"{stack} {count}\n")
+        except OSError as e:
+            logger.error(f"Error writing diagnostics profile to {self.profile_path}: {e}")
@@ -0,0 +1,326 @@
+import logging
+from functools import lru_cache
+from string import Formatter
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LOCALE = "en"
+
+# Message catalogs. English is the reference: every other locale falls back
+# to it for missing keys, and must use the same {placeholders}.
+CATALOGS = {
+    "en": {
+        "menu_welcome": "<b>🌟 Welcome to UDEA Finance Bot! 🌟</b>\n\nChoose an option below:",
+        "menu_prompt": "<b>🌟 Choose an option below:</b>",
+        "market_menu": "<b>📈 Market Prices 📉</b>\n\nSelect a market to explore:",
+        "btn_about": "ℹ️ About",
+        "btn_markets": "📈 Markets",
+        "btn_uzs": "🇺🇿 UZS Rates",
+        "btn_convert": "💱 Convert",
+        "btn_compare": "🌍 Compare",
+        "btn_admin": "👨‍💼 Contact Admin",
+        "btn_sp500": "📊 S&P 500",
+        "btn_crypto": "🚀 Crypto",
+        "btn_commodity": "⛏️ Commodities",
+        "btn_currency": "💵 Currencies",
+        "btn_back": "⬅️ Back to Main",
+        "btn_custom": "Custom",
+        "btn_cancel": "Cancel",
+        "welcome_text": (
+            "<b>🚀 Welcome to UDEA Finance Bot!</b>\n\n"
+            "To get started, please join our official channel first! 📢\n\n"
+            "<b>🔒 Why join?</b>\n"
+            "We provide real-time financial data, market news, and currency tools for free! "
+            "Joining the channel helps support the bot and keeps you updated with the latest news.\n\n"
+            "👉 Join here: <a href='https://t.me/UDEA_Finance_Club'>UDEA Finance Club</a>"
+        ),
+        "subscription_error": "❌ An error occurred while checking subscription. Please try again.",
+        "about_text": (
+            "<b>ℹ️ About UDEA Finance Bot</b>\n\n"
+            "Welcome to the UDEA Finance Bot, created by the UDEA Finance Club! 🎉\n\n"
+            "Our mission is to empower students and finance enthusiasts with real-time market data, currency rates, and financial insights. 📊💰\n\n"
+            "Led by Mirshod Yaxshiyev, this bot provides:\n"
+            "✅ Stock prices (S&P 500)\n"
+            "✅ Cryptocurrency updates\n"
+            "✅ Commodity and currency markets\n"
+            "✅ UZS exchange rates\n\n"
+            "Start exploring the world of finance today! 🚀"
+        ),
+        "admin_text": (
+            "<b>👨‍💼 Contact Admin</b>\n\n"
+            "Need help or have questions? Reach out to the admin of UDEA Finance Club! 📩\n\n"
+            "👉 Contact: <a href='https://t.me/mirshodbek_yakhshiyev'>@mirshodbek_yakhshiyev</a>\n"
+        ),
+        "convert_from": "💱 Choose the currency you want to convert from:",
+        "convert_to": "💱 Now, choose the currency you want to convert to:",
+        "convert_amount": "💱 Select the amount to convert:",
+        "convert_custom_prompt": "💱 Please enter the custom amount (e.g., 75.50):",
+        "convert_cancelled": "❌ Currency conversion cancelled.",
+        "convert_result": "{amount} {from_currency} = {converted_amount} {to_currency} 💱",
+        "rate_error": "❌ Error fetching exchange rate.",
+        "invalid_amount": "❌ Invalid amount. Please select an amount or enter a valid number.",
+        "compare_prompt": "🌍 Choose the base currency to compare against:",
+        "uzs_rates_title": "🇺🇿 UZS Exchange Rates",
+        "rates_title": "💱 {base} Exchange Rates",
+        "top_movers": "📊 Top movers",
+        "rates_error": "❌ Error: Unable to fetch currency rates.",
+        "sp500_title": "S&P 500 Stock Prices 📈",
+        "sp500_index": "S&P 500 Index:",
+        "sp500_error": "❌ Failed to fetch S&P 500 data. The API may be down or the API key may be invalid.",
+        "crypto_title": "Crypto Market 🚀",
+        "crypto_error": "❌ Unable to fetch cryptocurrency prices.",
+        "commodity_title": "Commodity Market ⛏️",
+        "commodity_error": "❌ Error fetching commodity prices.",
+        "commodity_timeout": "❌ Fetching commodity prices timed out. Please try again later.",
+        "currency_title": "Currency Market 💱",
+        "currency_error": "❌ Unable to fetch currency prices.",
+        "realtime_footer": "⚡ Real-time data updates automatically using API!",
+        "unknown_command": "❌ Unknown command. Please try again.",
+        "callback_error": "❌ An error occurred while handling the callback. Please try again.",
+        "select_option": "Please select an option from the menu.",
+        "error_conflict": "❌ A conflict occurred. The bot may be running elsewhere. Please try again later.",
+        "error_network": "❌ A network error occurred. Please try again later.",
+        "error_telegram": "❌ A Telegram error occurred. Please try again.",
+        "error_unexpected": "❌ An unexpected error occurred. Please try again.",
+        "btn_portfolio": "💼 Portfolio",
+        "portfolio_title": "💼 Your portfolio",
+        "portfolio_total": "Total: {total} {currency}",
+        "portfolio_empty": "💼 Your portfolio is empty.",
+        "portfolio_usage": (
+            "Usage:\n"
+            "/portfolio [CURRENCY] — show your portfolio (e.g. /portfolio EUR)\n"
+            "/portfolio set SYMBOL AMOUNT — set a holding (e.g. /portfolio set BTC 0.5, /portfolio set UZS 5M)\n"
+            "/portfolio remove SYMBOL — remove a holding"
+        ),
+        "portfolio_saved": "✅ Saved: {quantity} {symbol}",
+        "portfolio_removed": "✅ Removed: {symbol}",
+        "portfolio_unknown_currency": "❌ Unknown currency: {currency}",
+        "portfolio_partial": "⚠️ Partial total: no current price for {symbols}",
+        "portfolio_stale_price": "N/A (last price {time} UTC)",
+    },
+    "uz": {
+        "menu_welcome": "<b>🌟 UDEA Finance Botga xush kelibsiz! 🌟</b>\n\nQuyidagilardan birini tanlang:",
+        "menu_prompt": "<b>🌟 Quyidagilardan birini tanlang:</b>",
+        "market_menu": "<b>📈 Bozor narxlari 📉</b>\n\nKo'rish uchun bozorni tanlang:",
+        "btn_about": "ℹ️ Bot haqida",
+        "btn_markets": "📈 Bozorlar",
+        "btn_uzs": "🇺🇿 UZS kurslari",
+        "btn_convert": "💱 Konvertatsiya",
+        "btn_compare": "🌍 Taqqoslash",
+        "btn_admin": "👨‍💼 Admin bilan bog'lanish",
+        "btn_sp500": "📊 S&P 500",
+        "btn_crypto": "🚀 Kripto",
+        "btn_commodity": "⛏️ Xomashyo",
+        "btn_currency": "💵 Valyutalar",
+        "btn_back": "⬅️ Bosh menyu",
+        "btn_custom": "Boshqa summa",
+        "btn_cancel": "Bekor qilish",
+        "welcome_text": (
+            "<b>🚀 UDEA Finance Botga xush kelibsiz!</b>\n\n"
+            "Boshlash uchun avval rasmiy kanalimizga a'zo bo'ling! 📢\n\n"
+            "<b>🔒 Nega a'zo bo'lish kerak?</b>\n"
+            "Biz real vaqtdagi moliyaviy ma'lumotlar, bozor yangiliklari va valyuta vositalarini bepul taqdim etamiz! "
+            "Kanalga a'zo bo'lish botni qo'llab-quvvatlaydi va sizni so'nggi yangiliklardan xabardor qiladi.\n\n"
+            "👉 Bu yerda a'zo bo'ling: <a href='https://t.me/UDEA_Finance_Club'>UDEA Finance Club</a>"
+        ),
+        "subscription_error": "❌ Obunani tekshirishda xatolik yuz berdi. Iltimos, qayta urinib ko'ring.",
+        "about_text": (
+            "<b>ℹ️ UDEA Finance Bot haqida</b>\n\n"
+            "UDEA Finance Club tomonidan yaratilgan UDEA Finance Botga xush kelibsiz! 🎉\n\n"
+            "Bizning maqsadimiz talabalar va moliya ixlosmandlarini real vaqtdagi bozor ma'lumotlari, valyuta kurslari va moliyaviy tahlillar bilan ta'minlash. 📊💰\n\n"
+            "Mirshod Yaxshiyev boshchiligidagi ushbu bot quyidagilarni taqdim etadi:\n"
+            "✅ Aksiya narxlari (S&P 500)\n"
+            "✅ Kriptovalyuta yangilanishlari\n"
+            "✅ Xomashyo va valyuta bozorlari\n"
+            "✅ UZS valyuta kurslari\n\n"
+            "Moliya olamini bugunoq kashf eting! 🚀"
+        ),
+        "admin_text": (
+            "<b>👨‍💼 Admin bilan bog'lanish</b>\n\n"
+            "Yordam kerakmi yoki savollaringiz bormi? UDEA Finance Club admini bilan bog'laning! 📩\n\n"
+            "👉 Aloqa: <a href='https://t.me/mirshodbek_yakhshiyev'>@mirshodbek_yakhshiyev</a>\n"
+        ),
+        "convert_from": "💱 Qaysi valyutadan konvertatsiya qilmoqchisiz:",
+        "convert_to": "💱 Endi qaysi valyutaga konvertatsiya qilishni tanlang:",
+        "convert_amount": "💱 Konvertatsiya summasini tanlang:",
+        "convert_custom_prompt": "💱 Iltimos, summani kiriting (masalan, 75.50):",
+        "convert_cancelled": "❌ Valyuta konvertatsiyasi bekor qilindi.",
+        "rate_error": "❌ Valyuta kursini olishda xatolik.",
+        "invalid_amount": "❌ Noto'g'ri summa. Iltimos, summani tanlang yoki to'g'ri raqam kiriting.",
+        "compare_prompt": "🌍 Taqqoslash uchun asosiy valyutani tanlang:",
+        "uzs_rates_title": "🇺🇿 UZS valyuta kurslari",
+        "rates_title": "💱 {base} valyuta kurslari",
+        "top_movers": "📊 Eng ko'p o'zgarganlar",
+        "rates_error": "❌ Xatolik: valyuta kurslarini olib bo'lmadi.",
+        "sp500_title": "S&P 500 aksiya narxlari 📈",
+        "sp500_index": "S&P 500 indeksi:",
+        "sp500_error": "❌ S&P 500 ma'lumotlarini olib bo'lmadi. API ishlamayotgan yoki API kaliti noto'g'ri bo'lishi mumkin.",
+        "crypto_title": "Kripto bozori 🚀",
+        "crypto_error": "❌ Kriptovalyuta narxlarini olib bo'lmadi.",
+        "commodity_title": "Xomashyo bozori ⛏️",
+        "commodity_error": "❌ Xomashyo narxlarini olishda xatolik.",
+        "commodity_timeout": "❌ Xomashyo narxlarini olish vaqti tugadi. Iltimos, keyinroq urinib ko'ring.",
+        "currency_title": "Valyuta bozori 💱",
+        "currency_error": "❌ Valyuta narxlarini olib bo'lmadi.",
+        "realtime_footer": "⚡ Ma'lumotlar API orqali avtomatik yangilanadi!",
+        "unknown_command": "❌ Noma'lum buyruq. Iltimos, qayta urinib ko'ring.",
+        "callback_error": "❌ So'rovni bajarishda xatolik yuz berdi. Iltimos, qayta urinib ko'ring.",
+        "select_option": "Iltimos, menyudan birini tanlang.",
+        "error_conflict": "❌ Ziddiyat yuz berdi. Bot boshqa joyda ishlayotgan bo'lishi mumkin. Iltimos, keyinroq urinib ko'ring.",
+        "error_network": "❌ Tarmoq xatoligi yuz berdi. Iltimos, keyinroq urinib ko'ring.",
+        "error_telegram": "❌ Telegram xatoligi yuz berdi. Iltimos, qayta urinib ko'ring.",
+        "error_unexpected": "❌ Kutilmagan xatolik yuz berdi. Iltimos, qayta urinib ko'ring.",
+        "btn_portfolio": "💼 Portfel",
+        "portfolio_title": "💼 Sizning portfelingiz",
+        "portfolio_total": "Jami: {total} {currency}",
+        "portfolio_empty": "💼 Portfelingiz bo'sh.",
+        "portfolio_usage": (
+            "Foydalanish:\n"
+            "/portfolio [VALYUTA] — portfelni ko'rsatish (masalan, /portfolio EUR)\n"
+            "/portfolio set BELGI MIQDOR — aktiv qo'shish (masalan, /portfolio set BTC 0.5, /portfolio set UZS 5M)\n"
+            "/portfolio remove BELGI — aktivni o'chirish"
+        ),
+        "portfolio_saved": "✅ Saqlandi: {quantity} {symbol}",
+        "portfolio_removed": "✅ O'chirildi: {symbol}",
+        "portfolio_unknown_currency": "❌ Noma'lum valyuta: {currency}",
+        "portfolio_partial": "⚠️ Qisman jami: {symbols} uchun joriy narx yo'q",
+        "portfolio_stale_price": "N/A (oxirgi narx {time} UTC)",
+    },
+    "ru": {
+        "menu_welcome": "<b>🌟 Добро пожаловать в UDEA Finance Bot! 🌟</b>\n\nВыберите один из вариантов ниже:",
+        "menu_prompt": "<b>🌟 Выберите один из вариантов ниже:</b>",
+        "market_menu": "<b>📈 Рыночные цены 📉</b>\n\nВыберите рынок:",
+        "btn_about": "ℹ️ О боте",
+        "btn_markets": "📈 Рынки",
+        "btn_uzs": "🇺🇿 Курсы UZS",
+        "btn_convert": "💱 Конвертер",
+        "btn_compare": "🌍 Сравнить",
+        "btn_admin": "👨‍💼 Связаться с админом",
+        "btn_sp500": "📊 S&P 500",
+        "btn_crypto": "🚀 Крипто",
+        "btn_commodity": "⛏️ Сырьё",
+        "btn_currency": "💵 Валюты",
+        "btn_back": "⬅️ В главное меню",
+        "btn_custom": "Своя сумма",
+        "btn_cancel": "Отмена",
+        "welcome_text": (
+            "<b>🚀 Добро пожаловать в UDEA Finance Bot!</b>\n\n"
+            "Чтобы начать, сначала подпишитесь на наш официальный канал! 📢\n\n"
+            "<b>🔒 Зачем подписываться?</b>\n"
+            "Мы бесплатно предоставляем финансовые данные в реальном времени, рыночные новости и валютные инструменты! "
+            "Подписка на канал поддерживает бота и держит вас в курсе последних новостей.\n\n"
+            "👉 Подписаться: <a href='https://t.me/UDEA_Finance_Club'>UDEA Finance Club</a>"
+        ),
+        "subscription_error": "❌ Произошла ошибка при проверке подписки. Пожалуйста, попробуйте ещё раз.",
+        "about_text": (
+            "<b>ℹ️ О UDEA Finance Bot</b>\n\n"
+            "Добро пожаловать в UDEA Finance Bot, созданный UDEA Finance Club! 🎉\n\n"
+            "Наша миссия — дать студентам и любителям финансов рыночные данные в реальном времени, курсы валют и финансовую аналитику. 📊💰\n\n"
+            "Под руководством Миршода Яхшиева этот бот предоставляет:\n"
+            "✅ Цены акций (S&P 500)\n"
+            "✅ Обновления по криптовалютам\n"
+            "✅ Сырьевой и валютный рынки\n"
+            "✅ Курсы UZS\n\n"
+            "Начните изучать мир финансов уже сегодня! 🚀"
+        ),
+        "admin_text": (
+            "<b>👨‍💼 Связаться с админом</b>\n\n"
+            "Нужна помощь или есть вопросы? Напишите администратору UDEA Finance Club! 📩\n\n"
+            "👉 Контакт: <a href='https://t.me/mirshodbek_yakhshiyev'>@mirshodbek_yakhshiyev</a>\n"
+        ),
+        "convert_from": "💱 Выберите валюту, из которой хотите конвертировать:",
+        "convert_to": "💱 Теперь выберите валюту, в которую хотите конвертировать:",
+        "convert_amount": "💱 Выберите сумму для конвертации:",
+        "convert_custom_prompt": "💱 Пожалуйста, введите сумму (например, 75.50):",
+        "convert_cancelled": "❌ Конвертация валюты отменена.",
+        "rate_error": "❌ Ошибка при получении курса валют.",
+        "invalid_amount": "❌ Неверная сумма. Пожалуйста, выберите сумму или введите корректное число.",
+        "compare_prompt": "🌍 Выберите базовую валюту для сравнения:",
+        "uzs_rates_title": "🇺🇿 Курсы валют к UZS",
+        "rates_title": "💱 Курсы валют к {base}",
+        "top_movers": "📊 Наибольшие изменения",
+        "rates_error": "❌ Ошибка: не удалось получить курсы валют.",
+        "sp500_title": "Цены акций S&P 500 📈",
+        "sp500_index": "Индекс S&P 500:",
+        "sp500_error": "❌ Не удалось получить данные S&P 500. Возможно, API недоступен или ключ API недействителен.",
+        "crypto_title": "Криптовалютный рынок 🚀",
+        "crypto_error": "❌ Не удалось получить цены криптовалют.",
+        "commodity_title": "Сырьевой рынок ⛏️",
+        "commodity_error": "❌ Ошибка при получении цен на сырьё.",
+        "commodity_timeout": "❌ Время ожидания цен на сырьё истекло. Пожалуйста, попробуйте позже.",
+        "currency_title": "Валютный рынок 💱",
+        "currency_error": "❌ Не удалось получить курсы валют.",
+        "realtime_footer": "⚡ Данные обновляются автоматически через API!",
+        "unknown_command": "❌ Неизвестная команда. Пожалуйста, попробуйте ещё раз.",
+        "callback_error": "❌ Произошла ошибка при обработке запроса. Пожалуйста, попробуйте ещё раз.",
+        "select_option": "Пожалуйста, выберите вариант из меню.",
+        "error_conflict": "❌ Произошёл конфликт. Возможно, бот запущен в другом месте. Пожалуйста, попробуйте позже.",
+        "error_network": "❌ Произошла сетевая ошибка. Пожалуйста, попробуйте позже.",
+        "error_telegram": "❌ Произошла ошибка Telegram. Пожалуйста, попробуйте ещё раз.",
+        "error_unexpected": "❌ Произошла непредвиденная ошибка. Пожалуйста, попробуйте ещё раз.",
+        "btn_portfolio": "💼 Портфель",
+        "portfolio_title": "💼 Ваш портфель",
+        "portfolio_total": "Итого: {total} {currency}",
+        "portfolio_empty": "💼 Ваш портфель пуст.",
+        "portfolio_usage": (
+            "Использование:\n"
+            "/portfolio [ВАЛЮТА] — показать портфель (например, /portfolio EUR)\n"
+            "/portfolio set ТИКЕР КОЛИЧЕСТВО — задать актив (например, /portfolio set BTC 0.5, /portfolio set UZS 5M)\n"
+            "/portfolio remove ТИКЕР — удалить актив"
+        ),
+        "portfolio_saved": "✅ Сохранено: {quantity} {symbol}",
+        "portfolio_removed": "✅ Удалено: {symbol}",
+        "portfolio_unknown_currency": "❌ Неизвестная валюта: {currency}",
+        "portfolio_partial": "⚠️ Итог неполный: нет текущей цены для {symbols}",
+        "portfolio_stale_price": "N/A (последняя цена {time} UTC)",
+    },
+}
+
+# Compiled catalogs: one flat dict per locale with English fallbacks filled in
+_compiled = {}
+
+def _placeholders(template):
+    return {field for _, field, _, _ in Formatter().parse(template) if field is not None}
+
+# Function to compile the catalogs once at startup: fill gaps from the default
+# locale and drop translations whose placeholders don't match the reference
+def compile_catalogs():
+    reference = CATALOGS[DEFAULT_LOCALE]
+    reference_fields = {key: _placeholders(template) for key, template in reference.items()}
+    _compiled.clear()
+    for locale, catalog in CATALOGS.items():
+        compiled = dict(reference)
+        for key, template in catalog.items():
+            if key not in reference:
+                logger.warning(f"Unknown message key '{key}' in locale '{locale}'.")
+            elif _placeholders(template) != reference_fields[key]:
+                logger.warning(f"Placeholder mismatch for '{key}' in locale '{locale}', using '{DEFAULT_LOCALE}'.")
+            else:
+                compiled[key] = template
+        _compiled[locale] = compiled
+    resolve_locale.cache_clear()
+    logger.info(f"Compiled message catalogs for locales: {', '.join(sorted(_compiled))}")
+
+# Function to map a Telegram language_code (e.g. "ru", "uz", "en-US") to a supported locale
+@lru_cache(maxsize=256)
+def resolve_locale(language_code):
+    if not _compiled:
+        compile_catalogs()
+    if language_code:
+        code = language_code.lower().replace("_", "-")
+        if code in _compiled:
+            return code
+        if code.split("-")[0] in _compiled:
+            return code.split("-")[0]
+    return DEFAULT_LOCALE
+
+def get_locale(update):
+    user = update.effective_user if update else None
+    return resolve_locale(user.language_code if user else None)
+
+# Function to look up a translated message and fill in its placeholders
+def t(locale, key, **kwargs):
+    if not _compiled:
+        compile_catalogs()
+    template = _compiled.get(locale, _compiled[DEFAULT_LOCALE])[key]
+    return template.format(**kwargs) if kwargs else template
@@ -1,6 +1,7 @@
 import requests
 import asyncio
 import logging
+import math
 import os
 import time
 from datetime import datetime, timedelta
@@ -15,8 +16,14 @@ from telegram.ext import (
     CallbackQueryHandler,
     ConversationHandler,
 )
-from telegram.error import TelegramError, NetworkError, Conflict
+from telegram.error import TelegramError, NetworkError, Conflict, RetryAfter
 import html
+from rates import RateTable, render_comparison_panel, render_currency_market
+from outbox import Outbox, INTERACTIVE
+from diagnostics import LoopDiagnostics, track
+from locales import compile_catalogs, get_locale, t
+from portfolio import PortfolioTracker, parse_quantity
+from functools import lru_cache
 
 # Load environment variables from .env file
 load_dotenv()
@@ -35,52 +42,85 @@ EXCHANGE_RATE_API_KEY = os.getenv("EXCHANGE_RATE_API_KEY", "021088e30325b16dce1c
 ALPHA_VANTAGE_API_KEY = os.getenv("ALPHA_VANTAGE_API_KEY", "EISI552Y1AN7QPCJ")
 
 CHANNEL_USERNAME = '@UDEA_Finance_Club'
-EXCHANGE_API_URL = f"https://v6.exchangerate-api.com/v6/{EXCHANGE_RATE_API_KEY}/latest/UZS"
+EXCHANGE_API_URL = f"https://v6.exchangerate-api.com/v6/{EXCHANGE_RATE_API_KEY}/latest/USD"
 ALPHA_VANTAGE_URL = "https://www.alphavantage.co/query"
 COINGECKO_API_URL = "https://api.coingecko.com/api/v3/coins/markets"
 
-# List of currencies for UZS comparison and currency converter
-CURRENCIES = ["UZS", "USD", "GBP", "JPY", "EUR", "RUB", "QAR", "KZT"]
+# List of currencies for UZS comparison and currency converter (override with a comma-separated CURRENCIES env var)
+CURRENCIES = [cur.strip().upper() for cur in os.getenv("CURRENCIES", "UZS,USD,GBP,JPY,EUR,RUB,QAR,KZT").split(",") if cur.strip()]
+
+# Currency market pairs, quoted as units of the second currency per one unit of the first
+CURRENCY_PAIRS = [
+    ("USD", "EUR"),
+    ("GBP", "USD"),
+    ("USD", "JPY"),
+    ("USD", "CHF"),
+    ("EUR", "GBP"),
+    ("AUD", "USD"),
+    ("USD", "CAD"),
+    ("NZD", "USD"),
+    ("EUR", "JPY"),
+    ("GBP", "JPY"),
+]
 
 # Cache for market data with timestamps
 market_data_cache = {
     "sp500": {"data": None, "last_updated": None},
     "crypto": {"data": None, "last_updated": None},
     "commodity": {"data": None, "last_updated": None},
-    "currency": {"data": None, "last_updated": None},
-    "uzs_rates": {"data": None, "last_updated": None}
+    "rates": {"data": None, "last_updated": None, "previous": None}
 }
 CACHE_DURATION = timedelta(minutes=5)  # Refresh data every 5 minutes
 
-# Redesigned main menu with a compact layout and emojis
-MAIN_MENU_KEYBOARD = InlineKeyboardMarkup([
-    [
-        InlineKeyboardButton("ℹ️ About", callback_data="about_bot"),
-        InlineKeyboardButton("📈 Markets", callback_data="market_prices"),
-    ],
-    [
-        InlineKeyboardButton("🇺🇿 UZS Rates", callback_data="uzs_comparison"),
-        InlineKeyboardButton("💱 Convert", callback_data="currency_calculator"),
-    ],
-    [
-        InlineKeyboardButton("👨‍💼 Contact Admin", callback_data="admin_contact"),
-    ],
-])
-
-# Redesigned Market Prices submenu with a compact layout and emojis
-MARKET_PRICES_KEYBOARD = InlineKeyboardMarkup([
-    [
-        InlineKeyboardButton("📊 S&P 500", callback_data="market_sp500"),
-        InlineKeyboardButton("🚀 Crypto", callback_data="market_crypto"),
-    ],
-    [
-        InlineKeyboardButton("⛏️ Commodities", callback_data="market_commodity"),
-        InlineKeyboardButton("💵 Currencies", callback_data="market_currency"),
-    ],
-    [
-        InlineKeyboardButton("⬅️ Back to Main", callback_data="back_to_main"),
-    ],
-])
+# Rendered panels per (panel, locale), tagged with the data snapshot they were rendered from
+rendered_panel_cache = {}
+
+# Member portfolios, stored in SQLite and revalued incrementally on every price snapshot
+portfolios = PortfolioTracker(os.getenv("PORTFOLIO_DB_PATH", "portfolio.db"))
+
+# Every outgoing message goes through this queue (pacing, merging, flood-control retries)
+outbox = Outbox()
+
+# Event-loop lag and slow-handler diagnostics, enabled with BOT_DIAGNOSTICS=1
+diagnostics = LoopDiagnostics.from_env() if os.getenv("BOT_DIAGNOSTICS", "").lower() in ("1", "true", "yes") else None
+
+# Redesigned main menu with a compact layout and emojis, built once per locale
+@lru_cache(maxsize=None)
+def get_main_menu_keyboard(locale):
+    return InlineKeyboardMarkup([
+        [
+            InlineKeyboardButton(t(locale, "btn_about"), callback_data="about_bot"),
+            InlineKeyboardButton(t(locale, "btn_markets"), callback_data="market_prices"),
+        ],
+        [
+            InlineKeyboardButton(t(locale, "btn_uzs"), callback_data="uzs_comparison"),
+            InlineKeyboardButton(t(locale, "btn_convert"), callback_data="currency_calculator"),
+        ],
+        [
+            InlineKeyboardButton(t(locale, "btn_compare"), callback_data="compare_menu"),
+            InlineKeyboardButton(t(locale, "btn_portfolio"), callback_data="portfolio_USD"),
+        ],
+        [
+            InlineKeyboardButton(t(locale, "btn_admin"), callback_data="admin_contact"),
+        ],
+    ])
+
+# Redesigned Market Prices submenu with a compact layout and emojis, built once per locale
+@lru_cache(maxsize=None)
+def get_market_prices_keyboard(locale):
+    return InlineKeyboardMarkup([
+        [
+            InlineKeyboardButton(t(locale, "btn_sp500"), callback_data="market_sp500"),
+            InlineKeyboardButton(t(locale, "btn_crypto"), callback_data="market_crypto"),
+        ],
+        [
+            InlineKeyboardButton(t(locale, "btn_commodity"), callback_data="market_commodity"),
+            InlineKeyboardButton(t(locale, "btn_currency"), callback_data="market_currency"),
+        ],
+        [
+            InlineKeyboardButton(t(locale, "btn_back"), callback_data="back_to_main"),
+        ],
+    ])
 
 # Function to create a currency selection keyboard
 def get_currency_keyboard(callback_prefix):
@@ -92,7 +132,8 @@ def get_currency_keyboard(callback_prefix):
     return InlineKeyboardMarkup(keyboard)
 
 # Function to create an amount selection keyboard
-def get_amount_keyboard():
+@lru_cache(maxsize=None)
+def get_amount_keyboard(locale):
     return InlineKeyboardMarkup([
         [
             InlineKeyboardButton("10", callback_data="amount_10"),
@@ -100,20 +141,27 @@ def get_amount_keyboard():
             InlineKeyboardButton("100", callback_data="amount_100"),
         ],
         [
-            InlineKeyboardButton("Custom", callback_data="amount_custom"),
-            InlineKeyboardButton("Cancel", callback_data="amount_cancel"),
+            InlineKeyboardButton(t(locale, "btn_custom"), callback_data="amount_custom"),
+            InlineKeyboardButton(t(locale, "btn_cancel"), callback_data="amount_cancel"),
         ],
     ])
 
 # States for the currency conversion conversation
 FROM_CURRENCY, TO_CURRENCY, AMOUNT, CUSTOM_AMOUNT = range(4)
 
+# Utility function to queue a reply to the chat (and forum topic) an update came from
+def reply(update, text, priority=INTERACTIVE, **kwargs):
+    message = update.effective_message
+    if message is not None and message.is_topic_message:
+        kwargs.setdefault("message_thread_id", message.message_thread_id)
+    outbox.send(update.effective_chat.id, text, priority=priority, **kwargs)
+
 # Utility function to escape HTML special characters
 def escape_html(text):
     return html.escape(str(text))
 
-# Function to fetch UZS exchange rates with error handling
-def get_uzs_exchange_rates():
+# Function to fetch the full USD-based rate table with error handling
+def get_rate_table():
     try:
         response = requests.get(EXCHANGE_API_URL, timeout=10)
         response.raise_for_status()
@@ -123,12 +171,12 @@ def get_uzs_exchange_rates():
             if not rates:
                 logger.error("No exchange rate data found in response.")
                 return None
-            return {currency: rates.get(currency, "N/A") for currency in CURRENCIES}
+            return RateTable.from_rates(rates, CURRENCIES, data.get("time_last_update_unix"))
         else:
             logger.error(f"API response unsuccessful: {data.get('error-type', 'Unknown error')}")
             return None
     except requests.RequestException as e:
-        logger.error(f"Error fetching UZS exchange rates: {e}")
+        logger.error(f"Error fetching exchange rate table: {e}")
         return None
 
 # Function to fetch exchange rate between two currencies
@@ -176,7 +224,7 @@ def get_sp500_stock_prices():
             else:
                 error_message = data.get('Note', data.get('Information', 'Unknown error'))
                 logger.warning(f"Could not fetch data for {symbol}: {error_message}")
-                prices.append((symbol, "N/A"))
+                prices.append((symbol, None))
             time.sleep(12)  # Alpha Vantage free tier: 5 requests per minute
 
         params = {
@@ -193,22 +241,16 @@ def get_sp500_stock_prices():
         else:
             error_message = data.get('Note', data.get('Information', 'Unknown error'))
             logger.warning(f"Could not fetch data for SPY: {error_message}")
-            sp500_index = "N/A"
+            sp500_index = None
 
-        if all(price == "N/A" for _, price in prices) and sp500_index == "N/A":
+        if all(price is None for _, price in prices) and sp500_index is None:
             logger.error("Failed to fetch S&P 500 data for all symbols and index.")
-            return "❌ Failed to fetch S&P 500 data. The API may be down or the API key may be invalid."
-
-        message = "<b>S&P 500 Stock Prices 📈</b>\n"
-        for symbol, price in prices:
-            price_str = f"${price:.2f}" if isinstance(price, float) else price
-            message += f"{escape_html(symbol)}: {escape_html(price_str)}\n"
-        sp500_str = f"{sp500_index:.2f}" if isinstance(sp500_index, float) else sp500_index
-        message += f"<b>S&P 500 Index:</b> {escape_html(sp500_str)}\n"
-        return message
+            return None
+
+        return {"prices": prices, "index": sp500_index}
     except requests.RequestException as e:
         logger.error(f"Error fetching S&P 500 stock prices: {e}")
-        return "❌ Error fetching S&P 500 stock prices. Please try again later."
+        return None
 
 # Function to fetch Crypto Market prices using CoinGecko
 def get_crypto_prices():
@@ -224,18 +266,13 @@ def get_crypto_prices():
         response.raise_for_status()
         data = response.json()
         if isinstance(data, list):
-            message = "<b>Crypto Market 🚀</b>\n"
-            for coin in data:
-                name = coin["symbol"].upper()
-                price = coin["current_price"]
-                message += f"{escape_html(name)}: ${price:,.2f}\n"
-            return message
+            return [(coin["symbol"].upper(), coin["current_price"]) for coin in data]
         else:
             logger.error(f"Invalid response from CoinGecko API: {data}")
-            return "❌ Unable to fetch cryptocurrency prices."
+            return None
     except requests.RequestException as e:
         logger.error(f"Error fetching cryptocurrency prices: {e}")
-        return "❌ Error fetching cryptocurrency prices."
+        return None
 
 # Function to fetch Commodity Market prices using Alpha Vantage
 def get_commodity_prices():
@@ -263,76 +300,56 @@ def get_commodity_prices():
             else:
                 error_message = data.get('Note', data.get('Information', 'Unknown error'))
                 logger.warning(f"Could not fetch data for {name} ({symbol}): {error_message}")
-                prices.append((name, "N/A"))
+                prices.append((name, None))
             time.sleep(12)
 
-        message = "<b>Commodity Market ⛏️</b>\n"
-        for name, price in prices:
-            price_str = f"${price:,.2f}" if isinstance(price, float) else price
-            message += f"{escape_html(name)}: {escape_html(price_str)}\n"
-        return message
+        return prices
     except requests.RequestException as e:
         logger.error(f"Error fetching commodity prices: {e}")
-        return "❌ Error fetching commodity prices."
+        return None
 
-# Function to fetch Currency Market prices using ExchangeRate-API
-def get_currency_prices():
-    try:
-        response = requests.get(f"https://v6.exchangerate-api.com/v6/{EXCHANGE_RATE_API_KEY}/latest/USD", timeout=10)
-        response.raise_for_status()
-        data = response.json()
-        if data.get("result") == "success":
-            rates = data.get("conversion_rates", {})
-            if not rates:
-                logger.error("No currency rate data found in response.")
-                return "❌ Unable to fetch currency prices."
-            
-            pairs = [
-                ("USD/EUR", "EUR"),
-                ("GBP/USD", "GBP"),
-                ("USD/JPY", "JPY"),
-                ("USD/CHF", "CHF"),
-                ("EUR/GBP", "EUR", "GBP"),
-                ("AUD/USD", "AUD"),
-                ("USD/CAD", "CAD"),
-                ("NZD/USD", "NZD"),
-                ("EUR/JPY", "EUR", "JPY"),
-                ("GBP/JPY", "GBP", "JPY")
-            ]
-            
-            message = "<b>Currency Market 💱</b>\n"
-            for pair in pairs:
-                if len(pair) == 2:
-                    base, target = "USD", pair[1]
-                    rate = rates.get(target, "N/A")
-                    if rate != "N/A":
-                        rate = 1 / rate if base == "USD" else rate
-                        message += f"{escape_html(pair[0])}: {rate:.2f}\n"
-                    else:
-                        message += f"{escape_html(pair[0])}: N/A\n"
-                else:
-                    base, target = pair[1], pair[2]
-                    base_to_usd = rates.get(base, "N/A")
-                    target_to_usd = rates.get(target, "N/A")
-                    if base_to_usd != "N/A" and target_to_usd != "N/A":
-                        rate = (1 / base_to_usd) * target_to_usd
-                        message += f"{escape_html(pair[0])}: {rate:.2f}\n"
-                    else:
-                        message += f"{escape_html(pair[0])}: N/A\n"
-            return message
-        else:
-            logger.error(f"API response unsuccessful: {data.get('error-type', 'Unknown error')}")
-            return "❌ Unable to fetch currency prices."
-    except requests.RequestException as e:
-        logger.error(f"Error fetching currency prices: {e}")
-        return "❌ Error fetching currency prices."
+# Function to format a price list as "name: $price" lines, with N/A for missing prices
+def format_price_lines(prices, price_format):
+    lines = ""
+    for name, price in prices:
+        price_str = price_format.format(price) if price is not None else "N/A"
+        lines += f"{escape_html(name)}: {escape_html(price_str)}\n"
+    return lines
+
+# Function to render a market panel in the user's language from language-neutral data
+def render_market_panel(panel, data, locale):
+    if panel.startswith("compare_"):
+        base = panel.split("_", 1)[1]
+        if not data or base not in data.index:
+            return t(locale, "rates_error")
+        title = t(locale, "uzs_rates_title") if base == "UZS" else t(locale, "rates_title", base=escape_html(base))
+        previous = market_data_cache["rates"]["previous"]
+        return render_comparison_panel(data, base, CURRENCIES, title, previous, t(locale, "top_movers"))
+
+    if not data:
+        message = t(locale, f"{panel}_error")
+    elif panel == "sp500":
+        message = f"<b>{t(locale, 'sp500_title')}</b>\n" + format_price_lines(data["prices"], "${:.2f}")
+        sp500_str = f"{data['index']:.2f}" if data["index"] is not None else "N/A"
+        message += f"<b>{t(locale, 'sp500_index')}</b> {escape_html(sp500_str)}\n"
+    elif panel == "crypto":
+        message = f"<b>{t(locale, 'crypto_title')}</b>\n" + format_price_lines(data, "${:,.2f}")
+    elif panel == "commodity":
+        message = f"<b>{t(locale, 'commodity_title')}</b>\n" + format_price_lines(data, "${:,.2f}")
+    elif panel == "currency":
+        message = render_currency_market(data, CURRENCY_PAIRS, t(locale, "currency_title"))
+    else:
+        message = t(locale, "unknown_command")
+    return f"{message}\n{t(locale, 'realtime_footer')}"
 
 # Function to fetch and cache market data
+@track
 async def fetch_market_data(category):
     now = datetime.utcnow()
     cache_entry = market_data_cache[category]
     
-    if cache_entry["data"] and cache_entry["last_updated"] and (now - cache_entry["last_updated"]) < CACHE_DURATION:
+    # Failed fetches (None) are cached too, so a down API isn't hammered on every click
+    if cache_entry["last_updated"] and (now - cache_entry["last_updated"]) < CACHE_DURATION:
         return cache_entry["data"]
 
     if category == "sp500":
@@ -341,36 +358,117 @@ async def fetch_market_data(category):
         data = get_crypto_prices()
     elif category == "commodity":
         data = get_commodity_prices()
-    elif category == "currency":
-        data = get_currency_prices()
-    elif category == "uzs_rates":
-        data = get_uzs_exchange_rates()
+    elif category == "rates":
+        data = get_rate_table()
     else:
         data = "❌ Invalid category."
 
-    market_data_cache[category]["data"] = data
-    market_data_cache[category]["last_updated"] = now
+    store_market_data(category, data, now)
     return data
 
+# Function to store a fresh market data snapshot and revalue portfolios from it
+def store_market_data(category, data, now):
+    cache_entry = market_data_cache[category]
+    # Keep the last good snapshot around so panels can show movers against it,
+    # rotating only when upstream actually published new rates
+    old_data = cache_entry["data"]
+    if "previous" in cache_entry and data is not None and old_data is not None and not data.same_snapshot(old_data):
+        cache_entry["previous"] = old_data
+    cache_entry["data"] = data
+    cache_entry["last_updated"] = now
+    if data is not None:
+        revalued = portfolios.update_prices(extract_prices(category, data), source=category, updated_at=now)
+        logger.info(f"Revalued {revalued} portfolio positions after {category} refresh.")
+
+# Background job keeping the rate table and crypto prices fresh for portfolio valuations.
+# The fetchers run in a worker thread so their blocking requests never stall the event loop.
+# S&P 500 is left to its panel: Alpha Vantage's free tier can't afford a refresh every few minutes.
+async def refresh_portfolio_prices():
+    fetchers = {"rates": get_rate_table, "crypto": get_crypto_prices}
+    while True:
+        for category, fetcher in fetchers.items():
+            entry = market_data_cache[category]
+            now = datetime.utcnow()
+            if entry["last_updated"] and (now - entry["last_updated"]) < CACHE_DURATION:
+                continue
+            try:
+                data = await asyncio.to_thread(fetcher)
+            except Exception as e:
+                logger.error(f"Background refresh of {category} failed: {e}")
+                continue
+            store_market_data(category, data, datetime.utcnow())
+        await asyncio.sleep(CACHE_DURATION.total_seconds())
+
+# Function to pull symbol -> USD price pairs out of a market data snapshot
+def extract_prices(category, data):
+    if category == "crypto":
+        return dict(data)
+    if category == "sp500":
+        return {symbol: price for symbol, price in data["prices"] if price is not None}
+    if category == "rates":
+        return data.usd_prices()
+    return {}
+
+# Function to get a rendered market panel, re-rendering only when the locale or data snapshot changes
+async def get_market_panel(panel, locale):
+    category = "rates" if panel == "currency" or panel.startswith("compare_") else panel
+    data = await fetch_market_data(category)
+    snapshot = market_data_cache[category]["last_updated"]
+    cached = rendered_panel_cache.get((panel, locale))
+    if data and cached and cached[0] == snapshot:
+        return cached[1]
+    message = render_market_panel(panel, data, locale)
+    if data:
+        rendered_panel_cache[(panel, locale)] = (snapshot, message)
+    return message
+
+# Function to render a user's portfolio valued in the given currency.
+# It only reads cached snapshots; refreshing is left to the background job and the market panels.
+def render_portfolio(user_id, currency, locale):
+    total = portfolios.total(user_id)
+    if total is None:
+        return f"{t(locale, 'portfolio_empty')}\n\n{t(locale, 'portfolio_usage')}"
+    table = market_data_cache["rates"]["data"]
+    if table:
+        fx_rate = table.rate("USD", currency)
+    elif currency == "USD":
+        fx_rate = 1.0
+    else:
+        return t(locale, "rates_error")
+    if not math.isfinite(fx_rate):
+        return t(locale, "portfolio_unknown_currency", currency=escape_html(currency))
+
+    message = f"<b>{t(locale, 'portfolio_title')}</b>\n\n"
+    for symbol, quantity, price, updated_at in portfolios.positions(user_id):
+        if price is not None:
+            value_str = f"{quantity * price * fx_rate:,.2f} {escape_html(currency)}"
+        elif updated_at is not None:
+            value_str = t(locale, "portfolio_stale_price", time=updated_at.strftime("%Y-%m-%d %H:%M"))
+        else:
+            value_str = "N/A"
+        message += f"{escape_html(symbol)}: {quantity:,.10g} = {value_str}\n"
+    total_str = t(locale, "portfolio_total", total=f"{total * fx_rate:,.2f}", currency=escape_html(currency))
+    message += f"\n<b>{total_str}</b>"
+    unpriced = portfolios.unpriced(user_id)
+    if unpriced:
+        message += "\n" + t(locale, "portfolio_partial", symbols=escape_html(", ".join(unpriced)))
+    return message
+
 # Function to show the main menu with inline buttons as a new message
 async def show_main_menu(update: Update, context: ContextTypes.DEFAULT_TYPE, is_start=False):
-    menu_text = "<b>🌟 Welcome to UDEA Finance Bot! 🌟</b>\n\nChoose an option below:" if is_start else "<b>🌟 Choose an option below:</b>"
-    if update.callback_query:
-        query = update.callback_query
-        await query.message.reply_text(menu_text, reply_markup=MAIN_MENU_KEYBOARD, parse_mode='HTML')
-        logger.info("Main menu sent as a new message (callback).")
-    else:
-        await update.message.reply_text(menu_text, reply_markup=MAIN_MENU_KEYBOARD, parse_mode='HTML')
-        logger.info("Main menu sent as a new message (start).")
+    locale = get_locale(update)
+    menu_text = t(locale, "menu_welcome") if is_start else t(locale, "menu_prompt")
+    reply(update, menu_text, reply_markup=get_main_menu_keyboard(locale), parse_mode='HTML')
+    logger.info(f"Main menu sent as a new message ({'callback' if update.callback_query else 'start'}).")
 
 # Function to show the Market Prices submenu with inline buttons as a new message
 async def show_market_prices_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    menu_text = "<b>📈 Market Prices 📉</b>\n\nSelect a market to explore:"
-    query = update.callback_query
-    await query.message.reply_text(menu_text, reply_markup=MARKET_PRICES_KEYBOARD, parse_mode='HTML')
+    locale = get_locale(update)
+    reply(update, t(locale, "market_menu"), reply_markup=get_market_prices_keyboard(locale), parse_mode='HTML')
     logger.info("Market Prices menu sent as a new message.")
 
 # /start command handler with subscription check
+@track
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     logger.info(f"Received /start command from user {user_id}")
@@ -381,67 +479,62 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await show_main_menu(update, context, is_start=True)
         else:
             logger.info(f"User {user_id} is not a member of the channel, prompting to join")
-            welcome_text = (
-                "<b>🚀 Welcome to UDEA Finance Bot!</b>\n\n"
-                "To get started, please join our official channel first! 📢\n\n"
-                "<b>🔒 Why join?</b>\n"
-                "We provide real-time financial data, market news, and currency tools for free! "
-                "Joining the channel helps support the bot and keeps you updated with the latest news.\n\n"
-                "👉 Join here: <a href='https://t.me/UDEA_Finance_Club'>UDEA Finance Club</a>"
-            )
-            await update.message.reply_text(welcome_text, parse_mode='HTML')
+            reply(update, t(get_locale(update), "welcome_text"), parse_mode='HTML')
     except TelegramError as e:
         logger.error(f"Telegram error while checking subscription for user {user_id}: {e}")
-        await update.message.reply_text("❌ An error occurred while checking subscription. Please try again.")
+        reply(update, t(get_locale(update), "subscription_error"))
 
 # Handler for the "Currency Calculator" button
+@track
 async def start_currency_calculator(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
     logger.info("Currency Calculator button pressed.")
-    new_text = "💱 Choose the currency you want to convert from:"
-    await query.message.reply_text(new_text, reply_markup=get_currency_keyboard("from"), parse_mode='HTML')
+    reply(update, t(get_locale(update), "convert_from"), reply_markup=get_currency_keyboard("from"), parse_mode='HTML')
     logger.info("Currency calculator started as a new message.")
     return FROM_CURRENCY
 
 # Handler for selecting the "from" currency
+@track
 async def select_from_currency(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
     from_currency = query.data.split("_")[1]
     context.user_data["from_currency"] = from_currency
     logger.info(f"User selected 'from' currency: {from_currency}")
-    new_text = "💱 Now, choose the currency you want to convert to:"
-    await query.message.reply_text(new_text, reply_markup=get_currency_keyboard("to"), parse_mode='HTML')
+    reply(update, t(get_locale(update), "convert_to"), reply_markup=get_currency_keyboard("to"), parse_mode='HTML')
     logger.info("Updated to 'to' currency selection as a new message.")
     return TO_CURRENCY
 
 # Handler for selecting the "to" currency
+@track
 async def select_to_currency(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
     to_currency = query.data.split("_")[1]
     context.user_data["to_currency"] = to_currency
     logger.info(f"User selected 'to' currency: {to_currency}")
-    new_text = "💱 Select the amount to convert:"
-    await query.message.reply_text(new_text, reply_markup=get_amount_keyboard(), parse_mode='HTML')
+    locale = get_locale(update)
+    reply(update, t(locale, "convert_amount"), reply_markup=get_amount_keyboard(locale), parse_mode='HTML')
     logger.info("Updated to amount selection as a new message.")
     return AMOUNT
 
 # Handler for selecting the amount
+@track
 async def select_amount(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
     callback_data = query.data
+    locale = get_locale(update)
 
     if callback_data == "amount_cancel":
-        await query.message.reply_text("❌ Currency conversion cancelled.", parse_mode='HTML')
+        reply(update, t(locale, "convert_cancelled"), parse_mode='HTML')
         context.user_data.clear()
         await show_main_menu(update, context)
         return ConversationHandler.END
 
     if callback_data == "amount_custom":
-        await query.message.reply_text("💱 Please enter the custom amount (e.g., 75.50):", parse_mode='HTML')
+        reply(update, t(locale, "convert_custom_prompt"), parse_mode='HTML')
         return CUSTOM_AMOUNT
 
     # Extract the amount from the callback data (e.g., "amount_10" -> 10)
@@ -452,22 +545,24 @@ async def select_amount(update: Update, context: ContextTypes.DEFAULT_TYPE):
     rate = get_exchange_rate(from_currency, to_currency)
     if rate:
         converted_amount = round(amount * rate, 2)
-        await query.message.reply_text(f"{amount} {from_currency} = {converted_amount} {to_currency} 💱", parse_mode='HTML')
+        reply(update, t(locale, "convert_result", amount=amount, from_currency=from_currency, converted_amount=converted_amount, to_currency=to_currency), parse_mode='HTML')
     else:
-        await query.message.reply_text("❌ Error fetching exchange rate.", parse_mode='HTML')
+        reply(update, t(locale, "rate_error"), parse_mode='HTML')
 
     context.user_data.clear()
     await show_main_menu(update, context)
     return ConversationHandler.END
 
 # Handler for custom amount input
+@track
 async def handle_custom_amount(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
     callback_data = query.data
+    locale = get_locale(update)
 
     if callback_data == "custom_cancel":
-        await query.message.reply_text("❌ Currency conversion cancelled.", parse_mode='HTML')
+        reply(update, t(locale, "convert_cancelled"), parse_mode='HTML')
         context.user_data.clear()
         await show_main_menu(update, context)
         return ConversationHandler.END
@@ -481,156 +576,159 @@ async def handle_custom_amount(update: Update, context: ContextTypes.DEFAULT_TYP
         rate = get_exchange_rate(from_currency, to_currency)
         if rate:
             converted_amount = round(amount * rate, 2)
-            await query.message.reply_text(f"{amount} {from_currency} = {converted_amount} {to_currency} 💱", parse_mode='HTML')
+            reply(update, t(locale, "convert_result", amount=amount, from_currency=from_currency, converted_amount=converted_amount, to_currency=to_currency), parse_mode='HTML')
         else:
-            await query.message.reply_text("❌ Error fetching exchange rate.", parse_mode='HTML')
+            reply(update, t(locale, "rate_error"), parse_mode='HTML')
 
         context.user_data.clear()
         await show_main_menu(update, context)
         return ConversationHandler.END
 
     except ValueError:
-        await query.message.reply_text("❌ Invalid amount. Please select an amount or enter a valid number.", parse_mode='HTML')
+        reply(update, t(locale, "invalid_amount"), parse_mode='HTML')
         return AMOUNT
 
 # Handler for inline button callbacks (excluding currency conversion)
+@track
 async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
     callback_data = query.data
-    logger.info(f"Callback received: {callback_data} from user {update.effective_user.id}")
+    locale = get_locale(update)
+    logger.info(f"Callback received: {callback_data} from user {update.effective_user.id} ({locale})")
 
     try:
         if callback_data == "about_bot":
-            about_text = (
-                "<b>ℹ️ About UDEA Finance Bot</b>\n\n"
-                "Welcome to the UDEA Finance Bot, created by the UDEA Finance Club! 🎉\n\n"
-                "Our mission is to empower students and finance enthusiasts with real-time market data, currency rates, and financial insights. 📊💰\n\n"
-                "Led by Mirshod Yaxshiyev, this bot provides:\n"
-                "✅ Stock prices (S&P 500)\n"
-                "✅ Cryptocurrency updates\n"
-                "✅ Commodity and currency markets\n"
-                "✅ UZS exchange rates\n\n"
-                "Start exploring the world of finance today! 🚀"
-            )
-            await query.message.reply_text(about_text, parse_mode='HTML')
+            reply(update, t(locale, "about_text"), parse_mode='HTML')
             logger.info("About bot message sent as a new message.")
             await show_main_menu(update, context)
 
         elif callback_data == "admin_contact":
-            admin_text = (
-                "<b>👨‍💼 Contact Admin</b>\n\n"
-                "Need help or have questions? Reach out to the admin of UDEA Finance Club! 📩\n\n"
-                "👉 Contact: <a href='https://t.me/mirshodbek_yakhshiyev'>@mirshodbek_yakhshiyev</a>\n"
-            )
-            await query.message.reply_text(admin_text, parse_mode='HTML')
+            reply(update, t(locale, "admin_text"), parse_mode='HTML')
             logger.info("Admin contact message sent as a new message.")
             await show_main_menu(update, context)
 
         elif callback_data == "market_prices":
             await show_market_prices_menu(update, context)
 
-        elif callback_data == "uzs_comparison":
-            rates = await fetch_market_data("uzs_rates")
-            if rates:
-                message = "<b>🇺🇿 UZS Exchange Rates</b>\n\n"
-                for currency, rate in rates.items():
-                    if rate != "N/A":
-                        message += f"1 {escape_html(currency)} = {round(1 / rate, 2)} UZS\n"
-                    else:
-                        message += f"1 {escape_html(currency)} = N/A\n"
-                await query.message.reply_text(message, parse_mode="HTML")
-                logger.info("UZS exchange rates message sent as a new message.")
-            else:
-                error_message = "❌ Error: Unable to fetch currency rates."
-                await query.message.reply_text(error_message, parse_mode='HTML')
-                logger.info("UZS exchange rates error message sent as a new message.")
-            await show_main_menu(update, context)
+        elif callback_data == "compare_menu":
+            reply(update, t(locale, "compare_prompt"), reply_markup=get_currency_keyboard("compare"), parse_mode='HTML')
+            logger.info("Comparison base currency selection sent as a new message.")
 
-        elif callback_data == "market_sp500":
-            logger.info("Fetching S&P 500 stock prices...")
-            data = await fetch_market_data("sp500")
-            logger.info(f"S&P 500 data fetched: {data}")
-            new_message = f"{data}\n⚡ Real-time data updates automatically using API!"
-            await query.message.reply_text(new_message, parse_mode='HTML')
-            logger.info("S&P 500 message sent as a new message.")
-            await show_market_prices_menu(update, context)
+        elif callback_data == "uzs_comparison" or callback_data.startswith("compare_"):
+            panel = "compare_UZS" if callback_data == "uzs_comparison" else callback_data
+            message = await get_market_panel(panel, locale)
+            reply(update, message, parse_mode="HTML")
+            logger.info(f"{panel} exchange rates message sent as a new message.")
+            await show_main_menu(update, context)
 
-        elif callback_data == "market_crypto":
-            logger.info("Fetching Crypto Market prices...")
-            data = await fetch_market_data("crypto")
-            logger.info(f"Crypto Market data fetched: {data}")
-            new_message = f"{data}\n⚡ Real-time data updates automatically using API!"
-            await query.message.reply_text(new_message, parse_mode='HTML')
-            logger.info("Crypto Market message sent as a new message.")
+        elif callback_data in ("market_sp500", "market_crypto", "market_currency"):
+            panel = callback_data.split("_", 1)[1]
+            logger.info(f"Fetching {panel} market prices...")
+            message = await get_market_panel(panel, locale)
+            reply(update, message, parse_mode='HTML')
+            logger.info(f"{panel} market message sent as a new message.")
             await show_market_prices_menu(update, context)
 
         elif callback_data == "market_commodity":
             logger.info("Fetching Commodity Market prices...")
             try:
-                data = await asyncio.wait_for(fetch_market_data("commodity"), timeout=30)
-                logger.info(f"Commodity Market data fetched: {data}")
-                new_message = f"{data}\n⚡ Real-time data updates automatically using API!"
-                await query.message.reply_text(new_message, parse_mode='HTML')
+                message = await asyncio.wait_for(get_market_panel("commodity", locale), timeout=30)
+                reply(update, message, parse_mode='HTML')
                 logger.info("Commodity Market message sent as a new message.")
             except asyncio.TimeoutError:
                 logger.error("Fetching commodity prices timed out after 30 seconds.")
-                error_message = "❌ Fetching commodity prices timed out. Please try again later."
-                await query.message.reply_text(error_message, parse_mode='HTML')
+                reply(update, t(locale, "commodity_timeout"), parse_mode='HTML')
                 logger.info("Commodity Market timeout message sent as a new message.")
             await show_market_prices_menu(update, context)
 
-        elif callback_data == "market_currency":
-            logger.info("Fetching Currency Market prices...")
-            data = await fetch_market_data("currency")
-            logger.info(f"Currency Market data fetched: {data}")
-            new_message = f"{data}\n⚡ Real-time data updates automatically using API!"
-            await query.message.reply_text(new_message, parse_mode='HTML')
-            logger.info("Currency Market message sent as a new message.")
-            await show_market_prices_menu(update, context)
+        elif callback_data.startswith("portfolio_"):
+            currency = callback_data.split("_", 1)[1]
+            message = render_portfolio(update.effective_user.id, currency, locale)
+            reply(update, message, reply_markup=get_currency_keyboard("portfolio"), parse_mode='HTML')
+            logger.info(f"Portfolio in {currency} sent as a new message.")
 
         elif callback_data == "back_to_main":
             await show_main_menu(update, context)
 
         else:
             logger.warning(f"Unknown callback data received: {callback_data} from user {update.effective_user.id}")
-            error_message = "❌ Unknown command. Please try again."
-            await query.message.reply_text(error_message, parse_mode='HTML')
+            reply(update, t(locale, "unknown_command"), parse_mode='HTML')
             logger.info("Unknown command message sent as a new message.")
             await show_main_menu(update, context)
 
     except TelegramError as e:
         logger.error(f"Telegram error while handling callback: {e}")
-        await query.message.reply_text("❌ An error occurred while handling the callback. Please try again.", parse_mode='HTML')
+        reply(update, t(locale, "callback_error"), parse_mode='HTML')
         await show_main_menu(update, context)
 
+# /portfolio command handler: show holdings, or set/remove one
+@track
+async def portfolio_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    locale = get_locale(update)
+    user_id = update.effective_user.id
+    args = context.args or []
+    logger.info(f"Received /portfolio command from user {user_id}: {args}")
+
+    if args and args[0].lower() in ("set", "remove"):
+        try:
+            if args[0].lower() == "remove" and len(args) == 2:
+                quantity = 0.0
+            elif args[0].lower() == "set" and len(args) == 3:
+                quantity = parse_quantity(args[2])
+            else:
+                raise ValueError("Wrong number of arguments")
+            symbol = args[1].upper()
+            if not symbol.isalnum() or len(symbol) > 12:
+                raise ValueError(f"Invalid symbol: {symbol}")
+        except ValueError as e:
+            logger.info(f"Invalid /portfolio arguments from user {user_id}: {e}")
+            reply(update, t(locale, "portfolio_usage"), parse_mode='HTML')
+            return
+        portfolios.set_holding(user_id, symbol, quantity)
+        if quantity:
+            reply(update, t(locale, "portfolio_saved", quantity=f"{quantity:,.10g}", symbol=escape_html(symbol)), parse_mode='HTML')
+        else:
+            reply(update, t(locale, "portfolio_removed", symbol=escape_html(symbol)), parse_mode='HTML')
+        currency = "USD"
+    else:
+        currency = args[0].upper() if args else "USD"
+
+    message = render_portfolio(user_id, currency, locale)
+    reply(update, message, reply_markup=get_currency_keyboard("portfolio"), parse_mode='HTML')
+
 # Handler for unexpected text messages
+@track
 async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    await update.message.reply_text("Please select an option from the menu.", parse_mode='HTML')
+    reply(update, t(get_locale(update), "select_option"), parse_mode='HTML')
     await show_main_menu(update, context)
     logger.info(f"User {update.effective_user.id} sent unexpected text: {update.message.text}")
 
 # Error handler to catch and handle exceptions
 async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     logger.error(f"Update {update} caused error {context.error}")
+    locale = get_locale(update) if isinstance(update, Update) else None
     if isinstance(context.error, Conflict):
         logger.error("Conflict error detected. This usually means multiple bot instances are running or a webhook is set.")
         if update and update.effective_message:
-            await update.effective_message.reply_text("❌ A conflict occurred. The bot may be running elsewhere. Please try again later.", parse_mode='HTML')
+            await update.effective_message.reply_text(t(locale, "error_conflict"), parse_mode='HTML')
         logger.info("Exiting the bot due to Conflict error.")
         os._exit(1)  # Exit the application cleanly
+    elif isinstance(context.error, RetryAfter):
+        # Flood control: replying now would only extend the ban, the outbox retries on its own
+        logger.warning(f"Flood control triggered outside the outbound queue: {context.error}")
     elif isinstance(context.error, NetworkError):
         logger.error("Network error occurred. This might be a temporary issue with Telegram's servers.")
         if update and update.effective_message:
-            await update.effective_message.reply_text("❌ A network error occurred. Please try again later.", parse_mode='HTML')
+            reply(update, t(locale, "error_network"), parse_mode='HTML')
     elif isinstance(context.error, TelegramError):
         logger.error(f"Telegram error: {context.error}")
         if update and update.effective_message:
-            await update.effective_message.reply_text("❌ A Telegram error occurred. Please try again.", parse_mode='HTML')
+            reply(update, t(locale, "error_telegram"), parse_mode='HTML')
     else:
         logger.error(f"Unexpected error: {context.error}")
         if update and update.effective_message:
-            await update.effective_message.reply_text("❌ An unexpected error occurred. Please try again.", parse_mode='HTML')
+            reply(update, t(locale, "error_unexpected"), parse_mode='HTML')
 
 # Function to validate the bot token by making a simple API call
 def validate_bot_token(token):
@@ -699,6 +797,24 @@ async def delete_webhook(application):
             time.sleep(5)  # Wait 5 seconds before retrying
     return webhook_deleted
 
+# Open the portfolio store, start the price refresher and the outbound message queue (and diagnostics, if enabled) once the bot is initialized
+async def post_init(application):
+    portfolios.open()
+    application.bot_data["price_refresher"] = asyncio.get_running_loop().create_task(refresh_portfolio_prices())
+    outbox.start(application.bot)
+    if diagnostics:
+        diagnostics.start()
+
+# Stop the price refresher, flush pending messages, close the portfolio store and write the final diagnostics profile before the bot shuts down
+async def post_stop(application):
+    price_refresher = application.bot_data.pop("price_refresher", None)
+    if price_refresher:
+        price_refresher.cancel()
+    await outbox.stop()
+    portfolios.close()
+    if diagnostics:
+        await diagnostics.stop()
+
 # Main function to run the bot (now synchronous)
 def main():
     # Validate the bot token before proceeding
@@ -706,8 +822,18 @@ def main():
         logger.critical("Invalid or revoked bot token. Please check your TELEGRAM_BOT_TOKEN in the .env file. Exiting.")
         exit(1)
 
+    # Compile the message catalogs once, before any handler needs them
+    compile_catalogs()
+
     # Build the application with a global timeout for API requests
-    application = Application.builder().token(BOT_TOKEN).pool_timeout(30).build()
+    application = (
+        Application.builder()
+        .token(BOT_TOKEN)
+        .pool_timeout(30)
+        .post_init(post_init)
+        .post_stop(post_stop)
+        .build()
+    )
 
     # Add an error handler
     application.add_error_handler(error_handler)
@@ -737,6 +863,7 @@ def main():
 
     # Add handlers
     application.add_handler(CommandHandler("start", start))
+    application.add_handler(CommandHandler("portfolio", portfolio_command))
     application.add_handler(conv_handler)
     application.add_handler(CallbackQueryHandler(handle_callback))
     application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_text))
@@ -0,0 +1,227 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from collections import deque
+from datetime import timedelta
+from telegram.error import RetryAfter, TelegramError
+
+logger = logging.getLogger(__name__)
+
+# Message priorities: lower values are sent first
+INTERACTIVE = 0
+BROADCAST = 1
+
+# Telegram rejects messages longer than this, so merged replies must stay under it
+MAX_MESSAGE_LENGTH = 4096
+MERGE_SEPARATOR = "\n\n"
+
+# A single queued message waiting to be sent
+class OutboundMessage:
+    __slots__ = ("seq", "chat_id", "text", "priority", "kwargs", "enqueued_at", "attempts")
+
+    def __init__(self, seq, chat_id, text, priority, kwargs):
+        self.seq = seq
+        self.chat_id = chat_id
+        self.text = text
+        self.priority = priority
+        self.kwargs = kwargs
+        self.enqueued_at = time.monotonic()
+        self.attempts = 0
+
+# Central outbound queue for every message the bot sends.
+# Messages are kept in per-chat FIFOs and a priority heap decides which chat
+# goes next, so interactive replies overtake broadcasts without reordering a
+# single chat's conversation. Consecutive messages to the same chat are merged
+# into one send (e.g. a data panel followed by the menu keyboard), sends are
+# paced per chat and globally, and RetryAfter flood errors pause and requeue.
+class Outbox:
+    def __init__(self, per_chat_interval=1.0, global_interval=1 / 30, max_retries=5, metrics_interval=60):
+        self.per_chat_interval = per_chat_interval
+        self.global_interval = global_interval
+        self.max_retries = max_retries
+        self.metrics_interval = metrics_interval
+        self._bot = None
+        self._task = None
+        self._wakeup = asyncio.Event()
+        self._seq = itertools.count()
+        self._heap = []
+        self._messages = {}
+        self._chats = {}
+        self._chat_ready_at = {}
+        self._global_ready_at = 0.0
+        self._latencies = deque(maxlen=1000)
+        self._last_metrics_log = time.monotonic()
+        self.sent = 0
+        self.merged = 0
+        self.retries = 0
+        self.failed = 0
+
+    # Queue a message for a chat; returns immediately without waiting for delivery
+    def send(self, chat_id, text, priority=INTERACTIVE, **kwargs):
+        message = OutboundMessage(next(self._seq), chat_id, text, priority, kwargs)
+        self._messages[message.seq] = message
+        self._chats.setdefault(chat_id, deque()).append(message.seq)
+        heapq.heappush(self._heap, (priority, message.seq, chat_id))
+        self._wakeup.set()
+
+    # Queue the same message for many chats behind any interactive replies
+    def broadcast(self, chat_ids, text, **kwargs):
+        for chat_id in chat_ids:
+            self.send(chat_id, text, priority=BROADCAST, **kwargs)
+
+    def start(self, bot):
+        self._bot = bot
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        logger.info("Outbound message queue started.")
+
+    # Give pending messages a chance to go out, then stop the worker
+    async def stop(self, timeout=10):
+        deadline = time.monotonic() + timeout
+        while self._messages and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+        if self._messages:
+            logger.warning(f"Outbound queue stopped with {len(self._messages)} unsent messages.")
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._log_metrics()
+
+    def metrics(self):
+        latencies = sorted(self._latencies)
+        def percentile(fraction):
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(len(latencies) * fraction))] * 1000, 1)
+        return {
+            "queue_depth": len(self._messages),
+            "chats_waiting": len(self._chats),
+            "sent": self.sent,
+            "merged": self.merged,
+            "retries": self.retries,
+            "failed": self.failed,
+            "latency_p50_ms": percentile(0.5),
+            "latency_p95_ms": percentile(0.95),
+            "latency_max_ms": percentile(1.0),
+        }
+
+    def _log_metrics(self):
+        self._last_metrics_log = time.monotonic()
+        logger.info(f"Outbound queue metrics: {self.metrics()}")
+        # Forget pacing state for chats that are idle again
+        self._chat_ready_at = {chat_id: ready_at for chat_id, ready_at in self._chat_ready_at.items() if ready_at > self._last_metrics_log}
+
+    async def _run(self):
+        while True:
+            if time.monotonic() - self._last_metrics_log >= self.metrics_interval:
+                self._log_metrics()
+            batch = self._next_batch()
+            if batch is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self._next_ready_delay())
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            try:
+                await self._deliver(*batch)
+            except Exception as e:
+                self.failed += len(batch[1])
+                logger.error(f"Unexpected error while sending to chat {batch[0]}: {e}")
+
+    # Pick the highest priority chat whose pacing window is open
+    def _next_batch(self):
+        now = time.monotonic()
+        if now < self._global_ready_at:
+            return None
+        deferred = []
+        batch = None
+        while self._heap:
+            entry = heapq.heappop(self._heap)
+            seq, chat_id = entry[1], entry[2]
+            if seq not in self._messages:
+                continue  # already sent as part of a merged message
+            if self._chat_ready_at.get(chat_id, 0) > now:
+                deferred.append(entry)
+                continue
+            batch = self._take(chat_id)
+            if seq in self._messages:
+                deferred.append(entry)
+            break
+        for entry in deferred:
+            heapq.heappush(self._heap, entry)
+        return batch
+
+    def _next_ready_delay(self):
+        if not self._chats:
+            return self.metrics_interval
+        ready_at = min(self._chat_ready_at.get(chat_id, 0) for chat_id in self._chats)
+        return max(0.0, max(ready_at, self._global_ready_at) - time.monotonic())
+
+    # Pop the oldest message for a chat plus any following ones it can merge with
+    def _take(self, chat_id):
+        queue = self._chats[chat_id]
+        parts = [self._messages.pop(queue.popleft())]
+        length = len(parts[0].text)
+        while queue:
+            candidate = self._messages[queue[0]]
+            if not self._can_merge(parts[-1], candidate, length):
+                break
+            length += len(MERGE_SEPARATOR) + len(candidate.text)
+            parts.append(self._messages.pop(queue.popleft()))
+        if not queue:
+            del self._chats[chat_id]
+        return chat_id, parts
+
+    # Only the last part may carry a keyboard, and formatting must match
+    @staticmethod
+    def _can_merge(previous, candidate, length):
+        if "reply_markup" in previous.kwargs:
+            return False
+        candidate_options = {key: value for key, value in candidate.kwargs.items() if key != "reply_markup"}
+        if previous.kwargs != candidate_options:
+            return False
+        return length + len(MERGE_SEPARATOR) + len(candidate.text) <= MAX_MESSAGE_LENGTH
+
+    # Put messages back at the front of their chat queue after a flood error
+    def _requeue(self, chat_id, parts):
+        queue = self._chats.setdefault(chat_id, deque())
+        for message in reversed(parts):
+            message.attempts += 1
+            self._messages[message.seq] = message
+            queue.appendleft(message.seq)
+            heapq.heappush(self._heap, (message.priority, message.seq, chat_id))
+
+    async def _deliver(self, chat_id, parts):
+        text = MERGE_SEPARATOR.join(message.text for message in parts)
+        now = time.monotonic()
+        self._global_ready_at = now + self.global_interval
+        self._chat_ready_at[chat_id] = now + self.per_chat_interval
+        try:
+            await self._bot.send_message(chat_id, text, **parts[-1].kwargs)
+        except RetryAfter as e:
+            delay = e.retry_after.total_seconds() if isinstance(e.retry_after, timedelta) else float(e.retry_after)
+            self.retries += 1
+            self._global_ready_at = time.monotonic() + delay
+            self._chat_ready_at[chat_id] = self._global_ready_at
+            if parts[0].attempts < self.max_retries:
+                logger.warning(f"Flood control hit for chat {chat_id}, retrying in {delay} seconds.")
+                self._requeue(chat_id, parts)
+            else:
+                self.failed += len(parts)
+                logger.error(f"Giving up on {len(parts)} message(s) to chat {chat_id} after {self.max_retries} retries.")
+            return
+        except TelegramError as e:
+            self.failed += len(parts)
+            logger.error(f"Telegram error while sending to chat {chat_id}: {e}")
+            return
+        sent_at = time.monotonic()
+        for message in parts:
+            self._latencies.append(sent_at - message.enqueued_at)
+        self.sent += len(parts)
+        self.merged += len(parts) - 1
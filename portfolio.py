@@ -0,0 +1,142 @@
+import logging
+import math
+import sqlite3
+from collections import defaultdict
+
+logger = logging.getLogger(__name__)
+
+# Quantity suffixes accepted in commands, e.g. "5M UZS" or "1.5k USD"
+QUANTITY_SUFFIXES = {"K": 1e3, "M": 1e6, "B": 1e9}
+
+# Function to parse a holding quantity such as "0.5", "10", "5M" or "1,000"
+def parse_quantity(text):
+    text = text.strip().upper().replace(",", "")
+    multiplier = 1.0
+    if text and text[-1] in QUANTITY_SUFFIXES:
+        multiplier = QUANTITY_SUFFIXES[text[-1]]
+        text = text[:-1]
+    quantity = float(text) * multiplier
+    if not math.isfinite(quantity) or quantity < 0:
+        raise ValueError(f"Invalid quantity: {text}")
+    return quantity
+
+# Portfolio tracker backed by SQLite, with USD totals kept in memory.
+# A symbol -> {user_id: quantity} inverted index means a price tick only
+# touches the portfolios that hold that symbol: each one is adjusted by
+# quantity * (new price - old price) instead of being revalued from scratch,
+# so reading a total is a dictionary lookup. Each price remembers the source
+# snapshot it came from; when a later snapshot from that source no longer
+# carries the symbol, the price is dropped and excluded from totals.
+class PortfolioTracker:
+    def __init__(self, path):
+        self.path = path
+        self._db = None
+        self.prices = {}
+        self.price_sources = {}
+        self.price_updated_at = {}
+        self.holders = defaultdict(dict)
+        self.holdings = defaultdict(dict)
+        self.totals = {}
+        self.revaluations = 0
+
+    def open(self):
+        self._db = sqlite3.connect(self.path)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS holdings ("
+            "user_id INTEGER NOT NULL, symbol TEXT NOT NULL, quantity REAL NOT NULL, "
+            "PRIMARY KEY (user_id, symbol))"
+        )
+        self._db.commit()
+        self.load(self._db.execute("SELECT user_id, symbol, quantity FROM holdings"))
+        logger.info(f"Loaded {len(self.holdings)} portfolios from {self.path}.")
+
+    def close(self):
+        if self._db:
+            self._db.close()
+            self._db = None
+
+    def load(self, rows):
+        self.holders.clear()
+        self.holdings.clear()
+        for user_id, symbol, quantity in rows:
+            self.holders[symbol][user_id] = quantity
+            self.holdings[user_id][symbol] = quantity
+        self.totals = {user_id: self._value(holdings) for user_id, holdings in self.holdings.items()}
+
+    def _value(self, holdings):
+        prices = self.prices
+        return sum(quantity * prices[symbol] for symbol, quantity in holdings.items() if symbol in prices)
+
+    # Store a holding (quantity 0 removes it) and revalue just that portfolio
+    def set_holding(self, user_id, symbol, quantity):
+        with self._db:
+            if quantity:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO holdings (user_id, symbol, quantity) VALUES (?, ?, ?)",
+                    (user_id, symbol, quantity),
+                )
+            else:
+                self._db.execute("DELETE FROM holdings WHERE user_id = ? AND symbol = ?", (user_id, symbol))
+        if quantity:
+            self.holders[symbol][user_id] = quantity
+            self.holdings[user_id][symbol] = quantity
+        else:
+            self.holders.get(symbol, {}).pop(user_id, None)
+            self.holdings.get(user_id, {}).pop(symbol, None)
+        if self.holdings.get(user_id):
+            self.totals[user_id] = self._value(self.holdings[user_id])
+        else:
+            self.holdings.pop(user_id, None)
+            self.totals.pop(user_id, None)
+
+    # Apply a price snapshot (symbol -> USD price) from one source; returns how many
+    # portfolio positions were revalued. Symbols the source priced before but is
+    # missing (or reports as NaN) this time are dropped as stale.
+    def update_prices(self, prices, source=None, updated_at=None):
+        valid = {symbol: price for symbol, price in prices.items() if price is not None and math.isfinite(price) and price > 0}
+        revalued = 0
+        if source is not None:
+            for symbol in [symbol for symbol, origin in self.price_sources.items() if origin == source and symbol not in valid]:
+                revalued += self._drop_price(symbol)
+        totals = self.totals
+        for symbol, price in valid.items():
+            self.price_sources[symbol] = source
+            self.price_updated_at[symbol] = updated_at
+            old_price = self.prices.get(symbol, 0.0)
+            if price == old_price:
+                continue
+            self.prices[symbol] = price
+            holders = self.holders.get(symbol)
+            if not holders:
+                continue
+            delta = price - old_price
+            for user_id, quantity in holders.items():
+                totals[user_id] += quantity * delta
+            revalued += len(holders)
+        self.revaluations += revalued
+        return revalued
+
+    # Forget a stale price and revalue its holders without it
+    def _drop_price(self, symbol):
+        self.prices.pop(symbol, None)
+        self.price_sources.pop(symbol, None)
+        holders = self.holders.get(symbol, {})
+        for user_id in holders:
+            self.totals[user_id] = self._value(self.holdings[user_id])
+        return len(holders)
+
+    # Cached USD total of a user's priced holdings, or None if they hold nothing
+    def total(self, user_id):
+        return self.totals.get(user_id)
+
+    # (symbol, quantity, USD price or None, when the price was last seen) for each holding, largest first
+    def positions(self, user_id):
+        positions = [
+            (symbol, quantity, self.prices.get(symbol), self.price_updated_at.get(symbol))
+            for symbol, quantity in self.holdings.get(user_id, {}).items()
+        ]
+        return sorted(positions, key=lambda position: -(position[1] * (position[2] or 0)))
+
+    # Holdings of a user that have no current price and so are missing from the total
+    def unpriced(self, user_id):
+        return sorted(symbol for symbol in self.holdings.get(user_id, {}) if symbol not in self.prices)
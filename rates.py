@@ -0,0 +1,114 @@
+import html
+import numpy as np
+
+# Rate table backed by a NumPy vector of "units per reference currency".
+# Any cross rate is units[quote] / units[base], so the full N×N cross-rate
+# matrix is a single outer product and is computed lazily once per snapshot.
+class RateTable:
+    def __init__(self, codes, units, published_at=None):
+        self.codes = list(codes)
+        self.published_at = published_at
+        self.index = {code: i for i, code in enumerate(self.codes)}
+        self.units = np.asarray(units, dtype=float)
+        self._cross = None
+
+    # Build a table from an API "conversion_rates" dict, making sure every
+    # configured currency has a slot (missing ones become NaN instead of "N/A")
+    @classmethod
+    def from_rates(cls, rates, currencies=(), published_at=None):
+        codes = list(rates) + [code for code in currencies if code not in rates]
+        units = np.full(len(codes), np.nan)
+        for i, code in enumerate(codes):
+            try:
+                units[i] = float(rates.get(code))
+            except (TypeError, ValueError):
+                pass
+        units[units <= 0] = np.nan
+        return cls(codes, units, published_at)
+
+    # True when both tables come from the same upstream publication. The API
+    # republishes about once a day, so most cache refreshes return identical data.
+    def same_snapshot(self, other):
+        if self.published_at is not None and other.published_at is not None:
+            return self.published_at == other.published_at
+        return self.codes == other.codes and np.array_equal(self.units, other.units, equal_nan=True)
+
+    def __len__(self):
+        return len(self.codes)
+
+    # cross[i, j] is how many units of codes[j] one unit of codes[i] buys
+    def cross_matrix(self):
+        if self._cross is None:
+            with np.errstate(divide="ignore", invalid="ignore"):
+                self._cross = np.outer(1.0 / self.units, self.units)
+        return self._cross
+
+    def indices(self, codes):
+        return np.fromiter((self.index.get(code, -1) for code in codes), dtype=np.intp, count=len(codes))
+
+    # Vectorized lookup of many (base, quote) pairs; unknown codes yield NaN
+    def pairs(self, bases, quotes):
+        base_idx = self.indices(bases)
+        quote_idx = self.indices(quotes)
+        values = np.full(len(base_idx), np.nan)
+        valid = (base_idx >= 0) & (quote_idx >= 0)
+        values[valid] = self.cross_matrix()[base_idx[valid], quote_idx[valid]]
+        return values
+
+    # Value of one unit of each currency expressed in the base currency
+    def column(self, base, currencies):
+        return self.pairs(currencies, [base] * len(currencies))
+
+    def rate(self, base, quote):
+        return float(self.pairs([base], [quote])[0])
+
+    # USD value of one unit of every currency in the table
+    def usd_prices(self):
+        return dict(zip(self.codes, self.column("USD", self.codes).tolist()))
+
+# Function to find the currencies whose value in `base` moved the most
+# between two snapshots, returned as (code, percent change) tuples
+def top_movers(current, previous, base, limit=3):
+    if previous is None or base not in current.index or base not in previous.index:
+        return []
+    codes = [code for code in current.codes if code != base and code in previous.index]
+    if not codes:
+        return []
+    with np.errstate(divide="ignore", invalid="ignore"):
+        change = (current.column(base, codes) / previous.column(base, codes) - 1.0) * 100.0
+    finite = np.flatnonzero(np.isfinite(change) & (change != 0))
+    if finite.size == 0:
+        return []
+    order = finite[np.argsort(-np.abs(change[finite]), kind="stable")[:limit]]
+    return [(codes[i], float(change[i])) for i in order]
+
+# Function to format a rate to two decimals, keeping three significant digits below 1
+# so that e.g. 1 JPY or 1 UZS against a USD base doesn't collapse to 0.01 or 0.0
+def format_value(value):
+    if abs(value) >= 1:
+        return f"{round(float(value), 2)}"
+    return np.format_float_positional(value, precision=3, unique=True, fractional=False, trim="-")
+
+# Function to render a "1 X = ... BASE" comparison panel for any base currency
+def render_comparison_panel(table, base, currencies, title, previous=None, movers_title="📊 Top movers"):
+    values = table.column(base, currencies)
+    message = f"<b>{title}</b>\n\n"
+    for currency, value in zip(currencies, values):
+        rate_str = f"{format_value(value)} {html.escape(base)}" if np.isfinite(value) else "N/A"
+        message += f"1 {html.escape(currency)} = {rate_str}\n"
+    movers = top_movers(table, previous, base)
+    if movers:
+        message += f"\n<b>{movers_title}</b>\n"
+        for currency, change in movers:
+            message += f"{html.escape(currency)}: {change:+.2f}%\n"
+    return message
+
+# Function to render the currency market panel from (base, quote) pairs,
+# where each pair is quoted as units of quote per one unit of base
+def render_currency_market(table, pairs, title):
+    values = table.pairs([base for base, _ in pairs], [quote for _, quote in pairs])
+    message = f"<b>{title}</b>\n"
+    for (base, quote), value in zip(pairs, values):
+        rate_str = f"{value:.2f}" if np.isfinite(value) else "N/A"
+        message += f"{html.escape(base)}/{html.escape(quote)}: {rate_str}\n"
+    return message
@@ -0,0 +1,27 @@
+import asyncio
+import time
+from diagnostics import LoopDiagnostics, track
+
+@track
+async def blocking_fetch():
+    time.sleep(0.3)
+
+def test_blocking_call_is_attributed_to_innermost_tracked_function(tmp_path):
+    profile_path = tmp_path / "profile.txt"
+    diagnostics = LoopDiagnostics(block_threshold=0.1, sample_interval=0.005, probe_interval=0.02, profile_path=str(profile_path))
+
+    async def scenario():
+        diagnostics.start()
+        await asyncio.sleep(0.1)
+        await blocking_fetch()
+        await asyncio.sleep(0.2)
+        await diagnostics.stop()
+
+    asyncio.run(scenario())
+    event = diagnostics.slow_events[0]
+    assert event["offender"] == "blocking_fetch"
+    assert 250 <= event["duration_ms"] <= 380
+    assert abs(event["duration_ms"] - diagnostics.metrics()["lag_max_ms"]) < 30
+    lines = profile_path.read_text(encoding="utf-8").splitlines()
+    assert any(line.startswith("# slow: ") and "blocking_fetch" in line for line in lines)
+    assert any("test_diagnostics.py:blocking_fetch" in line and not line.startswith("#") for line in lines)
@@ -0,0 +1,70 @@
+import asyncio
+from datetime import datetime, timedelta
+import pytest
+import locales
+import mirshod
+from locales import compile_catalogs, resolve_locale, t
+
+@pytest.fixture
+def catalogs(monkeypatch):
+    monkeypatch.setitem(locales.CATALOGS, "uz", dict(locales.CATALOGS["uz"]))
+    yield locales.CATALOGS
+    monkeypatch.undo()
+    compile_catalogs()
+
+def test_missing_key_falls_back_to_english(catalogs):
+    del catalogs["uz"]["btn_about"]
+    compile_catalogs()
+    assert t("uz", "btn_about") == t("en", "btn_about")
+    assert t("uz", "btn_markets") == catalogs["uz"]["btn_markets"]
+
+def test_mismatched_placeholders_fall_back_to_english(catalogs):
+    catalogs["uz"]["portfolio_removed"] = "✅ O'chirildi: {sym}"
+    compile_catalogs()
+    assert t("uz", "portfolio_removed", symbol="BTC") == "✅ Removed: BTC"
+
+@pytest.mark.parametrize("language_code, locale", [("ru_RU", "ru"), ("uz-Latn", "uz"), ("EN-us", "en"), (None, "en"), ("de", "en")])
+def test_resolve_locale(language_code, locale):
+    assert resolve_locale(language_code) == locale
+
+@pytest.fixture
+def crypto_panel(monkeypatch):
+    entry = {"data": [("Bitcoin", 60000.0)], "last_updated": datetime(2026, 1, 1)}
+    renders = []
+    render = mirshod.render_market_panel
+
+    async def cached_fetch(category):
+        return entry["data"]
+
+    def counting_render(panel, data, locale):
+        renders.append((panel, locale))
+        return render(panel, data, locale)
+
+    monkeypatch.setitem(mirshod.market_data_cache, "crypto", entry)
+    monkeypatch.setattr(mirshod, "rendered_panel_cache", {})
+    monkeypatch.setattr(mirshod, "fetch_market_data", cached_fetch)
+    monkeypatch.setattr(mirshod, "render_market_panel", counting_render)
+    return entry, renders
+
+def test_panel_is_rendered_once_per_locale_and_snapshot(crypto_panel):
+    entry, renders = crypto_panel
+    first = asyncio.run(mirshod.get_market_panel("crypto", "en"))
+    assert asyncio.run(mirshod.get_market_panel("crypto", "en")) is first
+    assert len(renders) == 1
+
+    russian = asyncio.run(mirshod.get_market_panel("crypto", "ru"))
+    assert russian != first
+    assert renders == [("crypto", "en"), ("crypto", "ru")]
+
+    entry["data"] = [("Bitcoin", 61000.0)]
+    entry["last_updated"] += timedelta(minutes=5)
+    refreshed = asyncio.run(mirshod.get_market_panel("crypto", "en"))
+    assert "61,000.00" in refreshed
+    assert len(renders) == 3
+
+def test_failed_fetch_is_never_cached(crypto_panel):
+    entry, renders = crypto_panel
+    entry["data"] = None
+    assert asyncio.run(mirshod.get_market_panel("crypto", "en")) == asyncio.run(mirshod.get_market_panel("crypto", "en"))
+    assert len(renders) == 2
+    assert mirshod.rendered_panel_cache == {}
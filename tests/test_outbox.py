@@ -0,0 +1,119 @@
+import asyncio
+import time
+from telegram.error import RetryAfter, TelegramError
+from outbox import BROADCAST, MAX_MESSAGE_LENGTH, Outbox
+
+class FakeBot:
+    def __init__(self, failures=()):
+        self.failures = list(failures)
+        self.sent = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        if self.failures:
+            raise self.failures.pop(0)
+        self.sent.append((chat_id, text, kwargs))
+
+def drain(outbox):
+    batches = []
+    while True:
+        batch = outbox._next_batch()
+        if batch is None:
+            return batches
+        chat_id, parts = batch
+        batches.append((chat_id, [message.text for message in parts]))
+
+def test_interactive_replies_overtake_broadcasts():
+    outbox = Outbox()
+    outbox.broadcast([1, 2], "news")
+    outbox.send(3, "reply")
+    assert [chat_id for chat_id, _ in drain(outbox)] == [3, 1, 2]
+
+def test_messages_to_one_chat_keep_their_order_across_priorities():
+    outbox = Outbox()
+    outbox.send(1, "first", priority=BROADCAST, reply_markup="kb")
+    outbox.send(1, "second", reply_markup="kb")
+    assert drain(outbox) == [(1, ["first"]), (1, ["second"])]
+    assert outbox.metrics()["queue_depth"] == 0
+
+def test_panel_and_menu_are_merged_into_one_message():
+    outbox = Outbox()
+    outbox.send(1, "panel", parse_mode="HTML")
+    outbox.send(1, "menu", parse_mode="HTML", reply_markup="kb")
+    outbox.send(1, "next", parse_mode="HTML")
+    assert drain(outbox) == [(1, ["panel", "menu"]), (1, ["next"])]
+
+def test_merge_requires_matching_options_and_length():
+    outbox = Outbox()
+    outbox.send(1, "html", parse_mode="HTML")
+    outbox.send(1, "plain")
+    outbox.send(2, "x" * (MAX_MESSAGE_LENGTH - 1))
+    outbox.send(2, "y")
+    assert drain(outbox) == [(1, ["html"]), (1, ["plain"]), (2, ["x" * (MAX_MESSAGE_LENGTH - 1)]), (2, ["y"])]
+
+def test_busy_chat_does_not_block_other_chats():
+    outbox = Outbox()
+    outbox.send(1, "a")
+    outbox.send(2, "b")
+    outbox._chat_ready_at[1] = time.monotonic() + 60
+    assert drain(outbox) == [(2, ["b"])]
+    assert outbox.metrics()["chats_waiting"] == 1
+
+def test_retry_after_requeues_batch_in_order_and_pauses_chat():
+    bot = FakeBot([RetryAfter(5)])
+    outbox = Outbox()
+    outbox._bot = bot
+    outbox.send(1, "panel")
+    outbox.send(1, "menu", reply_markup="kb")
+    asyncio.run(outbox._deliver(*outbox._next_batch()))
+
+    assert bot.sent == []
+    assert outbox.retries == 1
+    assert outbox._chat_ready_at[1] > time.monotonic() + 4
+    assert outbox._next_batch() is None
+    outbox._global_ready_at = outbox._chat_ready_at[1] = 0
+    chat_id, parts = outbox._next_batch()
+    assert [message.text for message in parts] == ["panel", "menu"]
+    assert [message.attempts for message in parts] == [1, 1]
+
+def test_retry_gives_up_after_max_retries():
+    outbox = Outbox(max_retries=1)
+    outbox._bot = FakeBot([RetryAfter(0), RetryAfter(0)])
+    outbox.send(1, "hello")
+    for _ in range(2):
+        outbox._global_ready_at = 0
+        outbox._chat_ready_at.clear()
+        asyncio.run(outbox._deliver(*outbox._next_batch()))
+    assert outbox.failed == 1
+    assert outbox.metrics()["queue_depth"] == 0
+
+def test_worker_delivers_merged_messages_and_records_metrics():
+    bot = FakeBot([TelegramError("boom")])
+
+    async def scenario():
+        outbox = Outbox(per_chat_interval=0, global_interval=0)
+        outbox.start(bot)
+        outbox.send(1, "lost")
+        await asyncio.sleep(0.05)
+        outbox.send(2, "panel", parse_mode="HTML")
+        outbox.send(2, "menu", parse_mode="HTML", reply_markup="kb")
+        await outbox.stop()
+        return outbox.metrics()
+
+    metrics = asyncio.run(scenario())
+    assert bot.sent == [(2, "panel\n\nmenu", {"parse_mode": "HTML", "reply_markup": "kb"})]
+    assert metrics["sent"] == 2 and metrics["merged"] == 1 and metrics["failed"] == 1
+    assert metrics["latency_p50_ms"] is not None
+
+def test_reply_keeps_forum_topic_of_incoming_message(monkeypatch):
+    import mirshod
+    from types import SimpleNamespace
+    outbox = Outbox()
+    monkeypatch.setattr(mirshod, "outbox", outbox)
+    chat = SimpleNamespace(id=1)
+    topic = SimpleNamespace(effective_chat=chat, effective_message=SimpleNamespace(is_topic_message=True, message_thread_id=7))
+    general = SimpleNamespace(effective_chat=chat, effective_message=SimpleNamespace(is_topic_message=False, message_thread_id=None))
+    mirshod.reply(topic, "in topic")
+    mirshod.reply(topic, "also in topic")
+    mirshod.reply(general, "in general")
+    assert [message.kwargs for message in outbox._messages.values()] == [{"message_thread_id": 7}, {"message_thread_id": 7}, {}]
+    assert drain(outbox) == [(1, ["in topic", "also in topic"]), (1, ["in general"])]
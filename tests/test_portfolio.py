@@ -0,0 +1,102 @@
+import math
+import random
+from datetime import datetime
+import pytest
+import mirshod
+from portfolio import PortfolioTracker, parse_quantity
+from rates import RateTable
+
+@pytest.fixture
+def tracker(tmp_path):
+    tracker = PortfolioTracker(str(tmp_path / "portfolio.db"))
+    tracker.open()
+    yield tracker
+    tracker.close()
+
+def full_totals(tracker):
+    return {user_id: tracker._value(holdings) for user_id, holdings in tracker.holdings.items()}
+
+def test_parse_quantity_accepts_suffixes_and_rejects_garbage():
+    assert parse_quantity("5M") == 5_000_000
+    assert parse_quantity("1,500") == 1500
+    assert parse_quantity("0.5") == 0.5
+    for text in ("-1", "abc", "nan", ""):
+        with pytest.raises(ValueError):
+            parse_quantity(text)
+
+def test_incremental_totals_match_full_revaluation(tracker):
+    rng = random.Random(7)
+    symbols = [f"S{i}" for i in range(20)]
+    for user_id in range(200):
+        for symbol in rng.sample(symbols, 4):
+            tracker.set_holding(user_id, symbol, rng.uniform(0.1, 100))
+    prices = {symbol: rng.uniform(1, 1000) for symbol in symbols}
+    tracker.update_prices(prices, source="feed")
+    for _ in range(50):
+        moved = rng.sample(symbols, 3)
+        prices.update({symbol: prices[symbol] * rng.uniform(0.9, 1.1) for symbol in moved})
+        tracker.update_prices({symbol: prices[symbol] for symbol in moved})
+    expected = full_totals(tracker)
+    assert tracker.totals.keys() == expected.keys()
+    for user_id, value in expected.items():
+        assert math.isclose(tracker.total(user_id), value, rel_tol=1e-12)
+
+def test_tick_only_revalues_holders_of_changed_symbols(tracker):
+    tracker.set_holding(1, "BTC", 1)
+    tracker.set_holding(2, "ETH", 1)
+    tracker.set_holding(3, "BTC", 2)
+    tracker.update_prices({"BTC": 100.0, "ETH": 10.0})
+    assert tracker.update_prices({"BTC": 110.0, "ETH": 10.0}) == 2
+    assert tracker.total(3) == 220.0 and tracker.total(2) == 10.0
+
+def test_set_and_remove_keep_index_and_store_in_sync(tracker, tmp_path):
+    tracker.update_prices({"BTC": 100.0, "UZS": 0.0001})
+    tracker.set_holding(1, "BTC", 0.5)
+    tracker.set_holding(1, "UZS", 5_000_000)
+    tracker.set_holding(1, "BTC", 1)
+    assert tracker.total(1) == pytest.approx(600.0)
+    assert tracker.holders["BTC"] == {1: 1}
+
+    tracker.set_holding(1, "BTC", 0)
+    assert 1 not in tracker.holders["BTC"]
+    assert tracker.total(1) == pytest.approx(500.0)
+    tracker.set_holding(1, "UZS", 0)
+    assert tracker.total(1) is None and 1 not in tracker.holdings
+
+    tracker.set_holding(2, "ETH", 3)
+    reopened = PortfolioTracker(str(tmp_path / "portfolio.db"))
+    reopened.open()
+    assert dict(reopened.holdings) == {2: {"ETH": 3}}
+    reopened.close()
+
+def test_symbol_missing_from_its_source_is_dropped_as_stale(tracker):
+    seen = datetime(2026, 1, 1, 12, 0)
+    tracker.set_holding(1, "BTC", 1)
+    tracker.set_holding(1, "OLD", 10)
+    tracker.set_holding(1, "EUR", 100)
+    tracker.update_prices({"BTC": 100.0, "OLD": 2.0}, source="crypto", updated_at=seen)
+    tracker.update_prices({"EUR": 1.1}, source="rates", updated_at=seen)
+    assert tracker.total(1) == pytest.approx(230.0)
+
+    tracker.update_prices({"BTC": 100.0}, source="crypto", updated_at=datetime(2026, 1, 1, 12, 5))
+    tracker.update_prices({"EUR": float("nan")}, source="rates")
+    assert tracker.total(1) == pytest.approx(100.0)
+    assert tracker.unpriced(1) == ["EUR", "OLD"]
+    positions = {symbol: (price, updated_at) for symbol, _, price, updated_at in tracker.positions(1)}
+    assert positions["OLD"] == (None, seen)
+
+def test_portfolio_reply_reads_cache_and_marks_partial_total(tracker, monkeypatch):
+    async def no_fetch(category):
+        raise AssertionError("the portfolio reply must not fetch market data")
+    monkeypatch.setattr(mirshod, "fetch_market_data", no_fetch)
+    monkeypatch.setattr(mirshod, "portfolios", tracker)
+    monkeypatch.setitem(mirshod.market_data_cache, "rates", {"data": RateTable.from_rates({"USD": 1, "EUR": 0.5}), "last_updated": None, "previous": None})
+    tracker.set_holding(1, "BTC", 1)
+    tracker.set_holding(1, "AAPL", 10)
+    tracker.update_prices({"BTC": 100.0}, source="crypto")
+
+    message = mirshod.render_portfolio(1, "EUR", "en")
+    assert "BTC: 1 = 50.00 EUR" in message
+    assert "AAPL: 10 = N/A" in message
+    assert "Total: 50.00 EUR" in message
+    assert "Partial total: no current price for AAPL" in message
@@ -0,0 +1,45 @@
+import asyncio
+import numpy as np
+import mirshod
+from rates import RateTable, format_value, render_comparison_panel, top_movers
+
+def test_cross_matrix_quotes_units_of_quote_per_base():
+    table = RateTable.from_rates({"USD": 1, "EUR": 0.9, "JPY": 150})
+    assert table.rate("USD", "JPY") == 150
+    assert np.isclose(table.rate("EUR", "JPY"), 150 / 0.9)
+    assert np.isnan(table.rate("USD", "XXX"))
+
+def test_format_value_keeps_small_rates_readable():
+    assert format_value(12800.0) == "12800.0"
+    assert format_value(0.00667) == "0.00667"
+    assert format_value(7.8125e-05) == "0.0000781"
+
+def test_any_base_panel_does_not_round_small_rates_to_zero():
+    table = RateTable.from_rates({"USD": 1, "UZS": 12800, "JPY": 150})
+    message = render_comparison_panel(table, "USD", ["UZS", "JPY"], "USD")
+    assert "1 UZS = 0.0000781 USD" in message
+    assert "1 JPY = 0.00667 USD" in message
+
+def test_same_snapshot_prefers_publication_time():
+    old = RateTable.from_rates({"USD": 1, "EUR": 0.9}, published_at=100)
+    assert RateTable.from_rates({"USD": 1, "EUR": 0.9}, published_at=100).same_snapshot(old)
+    assert not RateTable.from_rates({"USD": 1, "EUR": 0.9}, published_at=200).same_snapshot(old)
+    assert RateTable.from_rates({"USD": 1, "EUR": 0.9}).same_snapshot(RateTable.from_rates({"USD": 1, "EUR": 0.9}))
+    assert not RateTable.from_rates({"USD": 1, "EUR": 0.91}).same_snapshot(RateTable.from_rates({"USD": 1, "EUR": 0.9}))
+
+def test_movers_survive_a_refresh_with_identical_data(monkeypatch):
+    snapshots = iter([
+        {"USD": 1, "EUR": 0.90, "UZS": 12800},
+        {"USD": 1, "EUR": 0.92, "UZS": 12800},
+        {"USD": 1, "EUR": 0.92, "UZS": 12800},
+    ])
+    monkeypatch.setattr(mirshod, "get_rate_table", lambda: RateTable.from_rates(next(snapshots)))
+    monkeypatch.setitem(mirshod.market_data_cache, "rates", {"data": None, "last_updated": None, "previous": None})
+    entry = mirshod.market_data_cache["rates"]
+
+    for _ in range(3):
+        entry["last_updated"] = None  # force a refresh as if the cache had expired
+        table = asyncio.run(mirshod.fetch_market_data("rates"))
+
+    assert entry["previous"] is not None
+    assert [code for code, _ in top_movers(table, entry["previous"], "UZS")] == ["EUR"]